@@ -11,6 +11,7 @@ interface Pizza {
   description: string;
   cook: string;
   image: string;
+  image_thumbnail?: string | null;
 }
 
 // Мок-данные
@@ -132,7 +133,7 @@ const Pizza: React.FC = () => {
             <div className={styles.card} key={pizza.id}>
               <div className={styles.info}>
                 <div className={styles.picture}>
-                  <img src={pizza.image} alt={pizza.name} className={styles.image} />
+                  <img src={pizza.image_thumbnail || pizza.image} alt={pizza.name} className={styles.image} loading="lazy" />
                 </div>
                 <div className={styles.info}>
                   <p className={styles.name}>{pizza.name}</p>
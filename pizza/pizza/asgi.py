@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pizza.settings')
+#под ASGI горячие GET-эндпоинты обслуживаются async-представлениями (см. pizza_lab.async_views)
+os.environ.setdefault('DJANGO_ASYNC_API_VIEWS', '1')
+#размер пула соединений с бд для ASGI (см. DB_POOL_SIZES)
+os.environ.setdefault('DJANGO_WORKER_TYPE', 'asgi')
 
 application = get_asgi_application()
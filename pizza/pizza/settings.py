@@ -10,6 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 from corsheaders.defaults import default_headers, default_methods
+import os
+from datetime import timedelta
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -37,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'pizza_lab',
     'storages',
     'rest_framework',
@@ -46,24 +50,59 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'pizza_lab.tokens.RoleJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
-    ]
+    ],
+    #время рендера ответа попадает в Server-Timing (см. pizza_lab.perf)
+    'DEFAULT_RENDERER_CLASSES': [
+        'pizza_lab.perf.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 MIDDLEWARE = [
+    #первым, чтобы время запроса включало остальные middleware
+    'pizza_lab.perf.PerformanceMiddleware',
+    'pizza_lab.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'pizza_lab.db_router.ReplicaPinningMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+#метрики запроса в заголовке Server-Timing; его видит любой клиент, поэтому по умолчанию только при DEBUG
+PERF_SERVER_TIMING = DEBUG
+#запросы в бд дольше этого пишутся в лог с местом в коде
+PERF_SLOW_QUERY_MS = 100
+#сколько одинаковых запросов в бд за один запрос считаются N+1
+PERF_DUPLICATE_QUERY_THRESHOLD = 5
+
+#/metrics отдаётся с заголовком Authorization: Bearer <METRICS_TOKEN> или адресам из METRICS_ALLOWED_NETWORKS
+#(адрес клиента - как у ограничения входов, pizza_lab.hashers.client_ip); METRICS_PUBLIC=1 открывает всем
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_NETWORKS = os.environ.get('METRICS_ALLOWED_NETWORKS', '127.0.0.0/8,::1/128').split(',')
+METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC') == '1'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        #одна json-строка на запрос (уровень INFO), медленные запросы и N+1 - WARNING
+        'pizza_lab.perf': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 CORS_ALLOW_ALL_ORIGINS = False
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
@@ -127,9 +166,52 @@ AWS_QUERYSTRING_AUTH = False
 AWS_S3_FILE_OVERWRITE = False
 AWS_DEFAULT_ACL = None
 
+#готовая схема OpenAPI (manage.py build_api_schema, см. pizza_lab.api_schema);
+#в docker-образе лежит вне /app, чтобы её не закрывал и не засорял смонтированный исходный код
+API_SCHEMA_DIR = os.environ.get('API_SCHEMA_DIR') or BASE_DIR / 'schema'
+#версия кода для имени файла схемы; если не задана, считается по исходникам
+API_SCHEMA_VERSION = os.environ.get('APP_VERSION', '')
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    #картинки пицц в MinIO, хранилище создаётся лениво (см. pizza_lab.clients)
+    'images': {'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage'},
+}
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+#как запущен процесс: 'wsgi' (потоки) или 'asgi'; pizza/asgi.py выставляет 'asgi'
+DJANGO_WORKER_TYPE = os.environ.get('DJANGO_WORKER_TYPE', 'wsgi')
+
+#размер пула соединений на процесс. под WSGI одновременно работают не больше WSGI_THREADS потоков,
+#под ASGI соединение держит каждый sync-вызов ORM, поэтому пул больше и с запасом на задачи
+DB_POOL_SIZES = {
+    'wsgi': {'min_size': 1, 'max_size': int(os.environ.get('WSGI_THREADS', 4))},
+    'asgi': {'min_size': 2, 'max_size': int(os.environ.get('ASGI_DB_POOL_MAX', 16))},
+}
+#пул есть только у psycopg 3 (psycopg[pool]); с psycopg2 соединения живут CONN_MAX_AGE секунд
+DB_POOL_ENABLED = find_spec('psycopg_pool') is not None and os.environ.get('DJANGO_DB_POOL', '1') == '1'
+
+if DB_POOL_ENABLED:
+    DB_CONN_MAX_AGE = 0  #с пулом django не держит соединения сам
+    DB_POOL_OPTIONS = {
+        'pool': {
+            **DB_POOL_SIZES[DJANGO_WORKER_TYPE],
+            'timeout': 5,  #сколько запрос ждёт свободное соединение, потом PoolTimeout
+            'max_idle': 300,
+            'max_lifetime': 1800,
+        },
+    }
+elif DJANGO_WORKER_TYPE == 'asgi':
+    #под ASGI каждый запрос идёт в новом потоке, постоянные соединения не переиспользуются и копятся
+    DB_CONN_MAX_AGE = 0
+    DB_POOL_OPTIONS = {}
+else:
+    DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+    DB_POOL_OPTIONS = {}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -138,25 +220,144 @@ DATABASES = {
         'PASSWORD': '123',
         'HOST':  '192.168.0.170',   #изменено,'192.168.0.171',  '127.0.0.1', 
         'PORT': 5455,
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        #перед повторным использованием соединение проверяется (и в пуле тоже), упавшее открывается заново
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'connect_timeout': 5,
+            **DB_POOL_OPTIONS,
+        },
     }
 }
 
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
-SESSION_CACHE_ALIAS = 'default'
+#алиасы реплик из DATABASES, на которые уходят безопасные чтения (см. pizza_lab.db_router).
+#для локальной проверки достаточно второй sqlite-базы:
+#DATABASES['replica'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'db.sqlite3', 'TEST': {'MIRROR': 'default'}}
+#DATABASE_REPLICAS = ['replica']
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['pizza_lab.db_router.ReplicaRouter']
+
+#сколько секунд после записи пользователь читает только с основной базы
+REPLICA_PIN_SECONDS = 5
+
+#сессии в redis, пока он недоступен - в таблице django_session (см. pizza_lab.sessions)
+SESSION_ENGINE = 'pizza_lab.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+#сколько секунд после ошибки redis сессии пишутся сразу в бд
+SESSION_REDIS_RETRY_SECONDS = 5
+
+#ModelBackend остаётся для сессий, записанных до CachedUserBackend: в них сохранён его путь
+AUTHENTICATION_BACKENDS = [
+    'pizza_lab.user_cache.CachedUserBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+#сколько живут закешированные роли пользователя; при сохранении пользователя запись сбрасывается
+USER_CACHE_TIMEOUT = 60
 
+#django_redis, попадания и промахи которого считаются в метриках запроса (pizza_lab.perf)
 CACHES = {
     'default': {
-        'BACKEND': 'django_redis.cache.RedisCache',
+        'BACKEND': 'pizza_lab.cache_backends.RedisCache',
         'LOCATION': 'redis://192.168.0.170:6379/1',
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            #если redis недоступен, кеш просто промахивается, а не роняет запрос
+            'IGNORE_EXCEPTIONS': True,
         }
-    }
+    },
+    #ошибки не глушим: по ним pizza_lab.sessions переключается на бд
+    'sessions': {
+        'BACKEND': 'pizza_lab.cache_backends.RedisCache',
+        'LOCATION': 'redis://192.168.0.170:6379/2',
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'SOCKET_CONNECT_TIMEOUT': 0.5,
+            'SOCKET_TIMEOUT': 0.5,
+            'CONNECTION_POOL_KWARGS': {'max_connections': 50, 'health_check_interval': 30},
+        }
+    },
+    #отозванные JWT (pizza_lab.tokens): ошибки не глушим, без redis токены не принимаются
+    'tokens': {
+        'BACKEND': 'pizza_lab.cache_backends.RedisCache',
+        'LOCATION': 'redis://192.168.0.170:6379/3',
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'SOCKET_CONNECT_TIMEOUT': 0.5,
+            'SOCKET_TIMEOUT': 0.5,
+        }
+    },
 }
+DJANGO_REDIS_LOG_IGNORED_EXCEPTIONS = True
+
+#завершать заказ автоматически, когда приготовлена последняя пицца (иначе только is_ready)
+ORDER_AUTO_COMPLETE = False
+
+#время жизни закешированного меню; актуальность обеспечивает версия меню
+MENU_CACHE_TIMEOUT = 60 * 60
+#как часто воркер сверяет свой снимок меню с версией в redis
+MENU_SNAPSHOT_POLL_SECONDS = 1
+
+
+#async-версии горячих эндпоинтов (pizza_lab.async_views); pizza/asgi.py включает их через окружение
+ASYNC_API_VIEWS = os.environ.get('DJANGO_ASYNC_API_VIEWS') == '1'
+
+#роли в access-токене живут до его истечения, при обновлении перечитываются
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    'AUTH_HEADER_TYPES': ('Bearer',),
+    'UPDATE_LAST_LOGIN': False,
+    #отзыв и ротация refresh сделаны в pizza_lab.tokens поверх redis, без приложения token_blacklist
+    'ROTATE_REFRESH_TOKENS': True,
+    'BLACKLIST_AFTER_ROTATION': False,
+    'TOKEN_OBTAIN_SERIALIZER': 'serializers.RoleTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'serializers.RoleTokenRefreshSerializer',
+}
+#алиас кеша со списком отозванных токенов
+JWT_REVOCATION_CACHE_ALIAS = 'tokens'
+
+#фоновые задачи (pizza_lab.jobs) выполняет manage.py run_jobs (сервис worker в docker-compose);
+#JOBS_EAGER = True выполняет их сразу, без воркера
+JOBS_EAGER = False
+JOB_MODULES = ['pizza_lab.images']
+JOBS_MAX_ATTEMPTS = 5
+#задержка перед повтором: base * 2 ** (попытка - 1), не больше max
+JOBS_RETRY_BASE_SECONDS = 5
+JOBS_RETRY_MAX_SECONDS = 10 * 60
+#задача в RUNNING дольше этого считается брошенной упавшим воркером
+JOBS_LOCK_TIMEOUT = 15 * 60
+JOBS_POLL_SECONDS = 1
+JOBS_CONCURRENCY = 2
+#куда веб-воркер складывает загрузки до отправки в хранилище; должна быть общей с run_jobs
+JOBS_STAGING_DIR = BASE_DIR / 'media' / 'staging'
 
 
 REDIS_HOST = '192.168.0.171'
 REDIS_PORT = 6379
+
+#pub/sub для событий задач поваров; None - брокер внутри процесса (один воркер, тесты)
+COOK_EVENTS_REDIS_URL = f'redis://{REDIS_HOST}:{REDIS_PORT}/0'
+#argon2 - основной; хеши старыми алгоритмами пересчитываются при входе (pizza_lab.hashers)
+PASSWORD_HASHERS = [
+    'pizza_lab.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+#память на один хеш в КиБ; умножается на PASSWORD_HASH_WORKERS в каждом процессе
+ARGON2_TIME_COST = 2
+ARGON2_MEMORY_COST = 19 * 1024
+ARGON2_PARALLELISM = 1
+
+#потоков хеширования на процесс и сколько входов может их ждать, прежде чем отвечать 503
+PASSWORD_HASH_WORKERS = 4
+PASSWORD_HASH_MAX_PENDING = 64
+#одновременных входов/регистраций с одного IP и на один логин, сверх - 429
+LOGIN_MAX_CONCURRENT_PER_IP = 5
+LOGIN_MAX_CONCURRENT_PER_USERNAME = 2
+LOGIN_SLOT_TIMEOUT = 30
+#сколько обратных прокси перед приложением дописывают X-Forwarded-For; 0 - адрес клиента из REMOTE_ADDR
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', '0'))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -202,5 +403,3 @@ STATICFILES_DIRS = [
 AUTH_USER_MODEL = 'pizza_lab.CustomUser'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-
-DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
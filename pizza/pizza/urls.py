@@ -15,46 +15,55 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.urls import path
-from pizza_lab import views
-from django.urls import path, include
+from django.conf import settings
+from pizza_lab import async_views, views
+from pizza_lab.api_schema import openapi_json, openapi_yaml, swagger_ui
+from pizza_lab.metrics import metrics_view
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
-from pizza_lab.views import PizzaViewSet, OrderPizzaViewSet,ProductInOrderViewSet, CookTaskListView
-from rest_framework.authtoken.views import obtain_auth_token
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-from pizza_lab.views import login_user, logout_user, register_user
+from pizza_lab.views import PizzaViewSet, OrderPizzaViewSet,ProductInOrderViewSet, CookTaskListView, SalesReportView, JobStatusView, TokenRevokeView, DbPoolStatsView
+from rest_framework_simplejwt.views import TokenRefreshView
+from pizza_lab.views import login_user, logout_user, register_user, obtain_token, cook_task_events
 
 router = DefaultRouter()
 router.register(r'pizzas', PizzaViewSet, basename='pizza')
 router.register(r'orders', OrderPizzaViewSet, basename='order')
 router.register(r'product_in_order', ProductInOrderViewSet)
 
-schema_view = get_schema_view(
-   openapi.Info(
-      title="Snippets API",
-      default_version='v1',
-      description="Test description",
-      terms_of_service="https://www.google.com/policies/terms/",
-      contact=openapi.Contact(email="contact@snippets.local"),
-      license=openapi.License(name="BSD License"),
-   ),
-   public=True,
-   permission_classes=(permissions.AllowAny,),
-)
-
-urlpatterns = [
+sync_urlpatterns = [
     path('admin/', admin.site.urls),
     path('', views.TypesPizzas, name='pizzas'),
     path('pizza/<int:id>/', views.Detail, name='pizza_detail'),
     path('remove_pizza/<int:id>/', views.remove_pizza, name='remove_pizza'),
     path('api/', include(router.urls)),
-    path('api/get-token/', obtain_auth_token, name='get-token'),
+    path('api/get-token/', obtain_token, name='get-token'),
+    path('api/token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    path('api/token/revoke/', TokenRevokeView.as_view(), name='token-revoke'),
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
     path('login',  login_user, name='login'),
     path('logout', logout_user, name='logout'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+    path('swagger/', swagger_ui, name='schema-swagger-ui'),
+    path('api/schema.json', openapi_json, name='schema-json'),
+    path('api/schema.yaml', openapi_yaml, name='schema-yaml'),
     path('register/', register_user, name='register'),
     path('api/cook/tasks/', CookTaskListView.as_view(), name='cook-task-list'),
+    path('api/cook/tasks/events/', cook_task_events, name='cook-task-events'),
+    path('api/reports/sales/', SalesReportView.as_view(), name='sales-report'),
+    path('api/jobs/<int:pk>/', JobStatusView.as_view(), name='job-status'),
+    path('api/metrics/db/', DbPoolStatsView.as_view(), name='db-pool-stats'),
+    path('metrics', metrics_view, name='metrics'),
+]
+
+#под ASGI горячие GET-эндпоинты обслуживают async-представления, остальное у них проксируется в sync
+async_urlpatterns = [
+    path('api/pizzas/', async_views.pizza_list),
+    re_path(r'^api/pizzas/(?P<pk>[^/.]+)/$', async_views.pizza_detail),
+    path('api/orders/user_orders/', async_views.user_orders),
+    path('api/cook/tasks/', async_views.cook_task_list),
 ]
+
+urlpatterns = (async_urlpatterns if settings.ASYNC_API_VIEWS else []) + sync_urlpatterns
+#статика при DEBUG: uvicorn, в отличие от runserver, сам её не отдаёт
+urlpatterns += staticfiles_urlpatterns()
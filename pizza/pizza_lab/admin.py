@@ -1,6 +1,8 @@
 from django.contrib import admin
-from pizza_lab.models import Pizza, Order_pizza, ProductInOrder
+from pizza_lab.models import Pizza, Order_pizza, ProductInOrder, DailyPizzaSales, Job
 
 admin.site.register(Pizza)
 admin.site.register(Order_pizza)
-admin.site.register(ProductInOrder) 
\ No newline at end of file
+admin.site.register(ProductInOrder) 
+admin.site.register(DailyPizzaSales)
+admin.site.register(Job)
\ No newline at end of file
@@ -0,0 +1,214 @@
+"""
+Схема OpenAPI (drf_yasg), построенная один раз на версию кода.
+manage.py build_api_schema записывает её в API_SCHEMA_DIR; воркер читает файл текущей версии
+(или строит схему при первом запросе, если файла нет) и дальше отдаёт её из памяти с ETag.
+Swagger UI тоже собирается при первом запросе, а не при импорте urls.py.
+"""
+import hashlib
+import os
+import threading
+from functools import cache
+from pathlib import Path
+
+import django
+import rest_framework
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.http import parse_etags
+from django.views.decorators.csrf import csrf_exempt
+
+FORMATS = {
+    'json': 'application/json; charset=utf-8',
+    'yaml': 'application/yaml; charset=utf-8',
+}
+#значения ?format= у Swagger UI и у представления drf_yasg
+FORMAT_ALIASES = {'openapi': 'json', 'json': 'json', 'yaml': 'yaml'}
+#модули, от которых зависит схема
+SOURCES = ('pizza', 'pizza_lab', 'serializers.py')
+
+_lock = threading.Lock()
+_schemas = {}
+
+
+def api_info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title="Snippets API",
+        default_version='v1',
+        description="Test description",
+        terms_of_service="https://www.google.com/policies/terms/",
+        contact=openapi.Contact(email="contact@snippets.local"),
+        license=openapi.License(name="BSD License"),
+    )
+
+
+def auth_paths():
+    """Вход, регистрация и выдача JWT - async-представления без DRF, drf_yasg их не находит"""
+    from drf_yasg import openapi
+
+    string = openapi.Schema(type=openapi.TYPE_STRING)
+    credentials = openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        required=['username', 'password'],
+        properties={'username': string, 'password': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_PASSWORD)},
+    )
+    registration = openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        required=['username', 'password'],
+        properties={**credentials.properties, 'role': openapi.Schema(type=openapi.TYPE_STRING, enum=['moderator', 'superuser', 'cook'])},
+    )
+    throttled = {
+        '429': openapi.Response('Слишком много одновременных попыток входа'),
+        '503': openapi.Response('Пул хеширования паролей перегружен'),
+    }
+
+    def post(operation_id, tag, body, responses):
+        return openapi.PathItem(post=openapi.Operation(
+            operation_id=operation_id,
+            parameters=[openapi.Parameter('data', openapi.IN_BODY, required=True, schema=body)],
+            responses=openapi.Responses({**responses, **throttled}),
+            tags=[tag],
+        ))
+
+    return {
+        '/api/get-token/': post('api_get-token_create', 'api', credentials, {
+            '200': openapi.Response('Пара токенов', openapi.Schema(type=openapi.TYPE_OBJECT, properties={'refresh': string, 'access': string})),
+            '401': openapi.Response('Неверные учётные данные'),
+        }),
+        '/login': post('login_create', 'login', credentials, {
+            '200': openapi.Response('Сессия создана'),
+            '400': openapi.Response('Неверные учётные данные'),
+        }),
+        '/register/': post('register_create', 'register', registration, {
+            '201': openapi.Response('Пользователь создан'),
+            '400': openapi.Response('Ошибки проверки'),
+            '403': openapi.Response('Недостаточно прав для роли'),
+        }),
+    }
+
+
+def schema_generator_class():
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    class SchemaGenerator(OpenAPISchemaGenerator):
+        def get_schema(self, request=None, public=False):
+            schema = super().get_schema(request, public)
+            base_path = schema.get('basePath', '/').rstrip('/')
+            for path, item in auth_paths().items():
+                schema.paths[path[len(base_path):] if path.startswith(base_path + '/') else path] = item
+            return schema
+
+    return SchemaGenerator
+
+
+@cache
+def get_schema_view():
+    from drf_yasg.views import get_schema_view
+    from rest_framework import permissions
+
+    return get_schema_view(
+        api_info(), public=True, permission_classes=(permissions.AllowAny,), generator_class=schema_generator_class(),
+    )
+
+
+@cache
+def swagger_ui_view():
+    return get_schema_view().with_ui('swagger', cache_timeout=0)
+
+
+@cache
+def code_version():
+    """API_SCHEMA_VERSION (версия релиза) или хеш исходников и версий библиотек, которые строят схему"""
+    if settings.API_SCHEMA_VERSION:
+        return settings.API_SCHEMA_VERSION
+    import drf_yasg
+
+    digest = hashlib.sha256(f'{django.__version__}:{rest_framework.__version__}:{drf_yasg.__version__}'.encode())
+    base_dir = Path(settings.BASE_DIR)
+    for source in SOURCES:
+        path = base_dir / source
+        for file in sorted(path.rglob('*.py')) if path.is_dir() else [path]:
+            digest.update(str(file.relative_to(base_dir)).encode())
+            digest.update(file.read_bytes())
+    return digest.hexdigest()[:12]
+
+
+def schema_path(fmt, version=None):
+    return Path(settings.API_SCHEMA_DIR) / f'openapi-{version or code_version()}.{fmt}'
+
+
+def generate_schema():
+    """{формат: содержимое} для текущего кода; запросов в бд не делает"""
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+
+    schema = schema_generator_class()(api_info()).get_schema(request=None, public=True)
+    return {
+        'json': OpenAPICodecJson(validators=[]).encode(schema),
+        'yaml': OpenAPICodecYaml(validators=[]).encode(schema),
+    }
+
+
+def write_schema(contents):
+    """Записывает файлы текущей версии; через временный файл, чтобы воркер не прочитал половину"""
+    paths = []
+    for fmt, content in contents.items():
+        path = schema_path(fmt)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'.{path.name}.{os.getpid()}')
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, path)
+        paths.append(path)
+    return paths
+
+
+def load_schemas():
+    try:
+        return {fmt: schema_path(fmt).read_bytes() for fmt in FORMATS}
+    except FileNotFoundError:
+        pass
+    contents = generate_schema()
+    try:
+        write_schema(contents)
+    except OSError:
+        #каталог может быть только для чтения, схема всё равно останется в памяти
+        pass
+    return contents
+
+
+def get_schema(fmt):
+    """(содержимое, etag) схемы текущей версии кода"""
+    if not _schemas:
+        with _lock:
+            if not _schemas:
+                for name, content in load_schemas().items():
+                    _schemas[name] = (content, f'"{hashlib.sha256(content).hexdigest()[:16]}"')
+    return _schemas[fmt]
+
+
+def schema_response(request, fmt):
+    content, etag = get_schema(fmt)
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(content, content_type=FORMATS[fmt])
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, no-cache'
+    return response
+
+
+@csrf_exempt
+def swagger_ui(request, *args, **kwargs):
+    #сама страница лёгкая, а схему, которую она запрашивает, отдаём готовой
+    fmt = FORMAT_ALIASES.get(request.GET.get('format'))
+    if fmt is not None and request.method in ('GET', 'HEAD'):
+        return schema_response(request, fmt)
+    return swagger_ui_view()(request, *args, **kwargs)
+
+
+def openapi_json(request):
+    return schema_response(request, 'json')
+
+
+def openapi_yaml(request):
+    return schema_response(request, 'yaml')
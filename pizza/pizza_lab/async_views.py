@@ -0,0 +1,148 @@
+"""
+Async-версии самых частых GET-эндпоинтов для запуска под ASGI (включаются ASYNC_API_VIEWS).
+Отвечают так же, как соответствующие действия DRF; запросы, которые они не обслуживают
+(другие методы, пагинация, фильтры), передаются в обычные sync-представления.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.encoders import JSONEncoder
+
+from pizza_lab import kitchen, menu_cache
+from pizza_lab.db_router import areplica_reads
+from pizza_lab.menu_snapshot import MenuSnapshot
+from pizza_lab.models import Order_pizza, Pizza
+from pizza_lab.perf import span
+from pizza_lab.tokens import RevocationUnavailable, aauthenticate_request
+from pizza_lab.views import CookTaskListView, OrderPizzaViewSet, PizzaViewSet
+from serializers import OrderPizzaSerializer, PizzaSerializer
+
+
+def no_params(request):
+    return not request.GET
+
+
+def async_get(sync_view, supports=no_params):
+    """
+    GET/HEAD, которые поддерживает async-реализация, обслуживаются ею, остальное - sync_view.
+    request.user заполняется по JWT или сессии до вызова реализации.
+    """
+    sync_view = sync_to_async(sync_view)
+
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or not supports(request):
+                return await sync_view(request, *args, **kwargs)
+            try:
+                request.user = await aauthenticate_request(request)
+            except (AuthenticationFailed, RevocationUnavailable) as error:
+                return json_response({'detail': str(error.detail)}, status=error.status_code)
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def json_response(data, status=200):
+    #кодировщик DRF: даты и Decimal в том же виде, что у sync-представлений
+    with span('render'):
+        return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder, json_dumps_params={'ensure_ascii': False})
+
+
+def not_authenticated():
+    return json_response({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+
+@async_get(PizzaViewSet.as_view({'get': 'list', 'post': 'create'}))
+@areplica_reads
+async def pizza_list(request): #PizzaViewSet.list без параметров запроса
+    user = request.user
+    draft_order_id = await menu_cache.aget_draft_order_id(user)
+    cache_key = await sync_to_async(menu_cache.menu_cache_key)(request)
+    entry = await sync_to_async(menu_cache.get_menu)(cache_key)
+
+    if entry is not None:
+        etag = menu_cache.make_etag(entry['etag'], draft_order_id)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return with_cache_headers(HttpResponse(status=304), etag)
+    else:
+        queryset = Pizza.objects.filter(deleted=False).select_related('cook')
+        if user.is_authenticated and getattr(user, 'is_cook', False):
+            queryset = queryset.filter(cook=user)
+        pizzas = [pizza async for pizza in queryset]
+        with span('serialize'):
+            data = PizzaSerializer(pizzas, many=True, context={'request': request}).data
+        entry = await sync_to_async(menu_cache.set_menu)(cache_key, list(data))
+
+    response = json_response({
+        "pizzas": entry['pizzas'],
+        "draft_order_id": draft_order_id,
+    })
+    return with_cache_headers(response, menu_cache.make_etag(entry['etag'], draft_order_id))
+
+
+def with_cache_headers(response, etag):
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Cookie', 'Authorization'])
+    return response
+
+
+@async_get(
+    PizzaViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}),
+    supports=lambda request: True,
+)
+async def pizza_detail(request, pk): #PizzaViewSet.retrieve из снимка меню
+    pizza = await MenuSnapshot().aget(pk)
+    if pizza is None:
+        return json_response({'detail': 'No Pizza matches the given query.'}, status=404)
+    return json_response(dict(pizza.data))
+
+
+@async_get(OrderPizzaViewSet.as_view({'get': 'user_orders'}))
+@areplica_reads
+async def user_orders(request): #OrderPizzaViewSet.user_orders без пагинации
+    user = request.user
+    if not user.is_authenticated:
+        return not_authenticated()
+
+    if user.is_cook:
+        orders = Order_pizza.objects.exclude(
+            status__in=[Order_pizza.OrderStatus.DELETED, Order_pizza.OrderStatus.DRAFT]
+        )
+    else:
+        orders = Order_pizza.objects.filter(client=user).exclude(status=Order_pizza.OrderStatus.DELETED)
+    orders = [order async for order in OrderPizzaSerializer.setup_eager_loading(orders)]
+
+    with span('serialize'):
+        data = OrderPizzaSerializer(orders, many=True, context={'request': request}).data
+    return json_response(data)
+
+
+@async_get(CookTaskListView.as_view(), supports=lambda request: True)
+@areplica_reads
+async def cook_task_list(request): #CookTaskListView
+    user = request.user
+    if not user.is_authenticated:
+        return not_authenticated()
+    if not getattr(user, 'is_cook', False):
+        return json_response({'detail': 'Only cooks can access this.'}, status=403)
+
+    result = [
+        {
+            'pizza_id': entry.product.id,
+            'pizza_name': entry.product.name,
+            'pizza_image': request.build_absolute_uri(entry.product.image.url) if entry.product.image else None,
+            'order_id': entry.order.id,
+            'formation_datetime': entry.order.formation_datetime,
+            'remaining_to_cook': entry.remaining,
+        }
+        async for entry in kitchen.cook_tasks(user)
+    ]
+    return json_response(result)
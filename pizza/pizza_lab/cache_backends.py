@@ -0,0 +1,7 @@
+from django_redis.cache import RedisCache as BaseRedisCache
+
+from pizza_lab.perf import CacheMetricsMixin
+
+
+class RedisCache(CacheMetricsMixin, BaseRedisCache):
+    """django_redis, попадания и промахи которого видны в метриках запроса (pizza_lab.perf)"""
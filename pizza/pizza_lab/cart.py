@@ -0,0 +1,75 @@
+from collections import OrderedDict
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from pizza_lab import menu_cache
+from pizza_lab.metrics import record_cart_mutations
+from pizza_lab.models import Order_pizza, ProductInOrder
+from pizza_lab.progress import line_ready_expression, refresh_order_totals
+
+#предел изменения количества за одну операцию: суммы дельт остаются в пределах integer-колонки
+MAX_CART_DELTA = 1000
+
+UPSERT_SQL = """
+    INSERT INTO {table} (order_id, product_id, quantity, end_quantity, is_ready)
+    VALUES {values}
+    ON CONFLICT (order_id, product_id) DO UPDATE SET
+        quantity = {table}.quantity + EXCLUDED.quantity,
+        is_ready = {table}.end_quantity >= {table}.quantity + EXCLUDED.quantity
+"""
+
+
+def merge_operations(operations):
+    """Складывает дельты по одной пицце, нулевые отбрасывает"""
+    deltas = OrderedDict()
+    for operation in operations:
+        product_id = operation['product_id']
+        deltas[product_id] = deltas.get(product_id, 0) + operation['delta']
+    return OrderedDict((product_id, delta) for product_id, delta in deltas.items() if delta)
+
+
+def apply_cart_operations(user, operations):
+    """
+    Применяет к черновику пользователя список {product_id, delta} в одной транзакции.
+    Возвращает черновик или None, если корзина опустела и черновик удалён.
+    """
+    deltas = merge_operations(operations)
+
+    with transaction.atomic():
+        draft_order, created = Order_pizza.objects.get_or_create(client=user, status=Order_pizza.OrderStatus.DRAFT)
+        record_cart_mutations(deltas)
+        if created:
+            transaction.on_commit(lambda: menu_cache.forget_draft_order(user.id))
+
+        increments = [(product_id, delta) for product_id, delta in deltas.items() if delta > 0]
+        if increments:
+            #одно выражение на все добавления: вставка или quantity + delta на стороне бд
+            sql = UPSERT_SQL.format(
+                table=ProductInOrder._meta.db_table,
+                values=', '.join(['(%s, %s, %s, 0, FALSE)'] * len(increments)),
+            )
+            params = []
+            for product_id, delta in increments:
+                params += [draft_order.id, product_id, delta]
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+
+        for product_id, delta in deltas.items():
+            if delta > 0:
+                continue
+            products = ProductInOrder.objects.filter(order=draft_order, product_id=product_id)
+            products.filter(quantity__lte=-delta).delete()
+            products.filter(quantity__gt=-delta).update(
+                quantity=F('quantity') + delta,
+                is_ready=line_ready_expression(F('quantity') + delta),
+            )
+
+        if not ProductInOrder.objects.filter(order=draft_order).exists():
+            draft_order.delete()
+            transaction.on_commit(lambda: menu_cache.forget_draft_order(user.id))
+            return None
+
+        refresh_order_totals([draft_order.id])
+
+    return draft_order
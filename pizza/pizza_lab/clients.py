@@ -0,0 +1,38 @@
+"""
+Клиенты внешних сервисов (S3/MinIO, redis), которые создаются при первом обращении, а не при импорте:
+manage.py-команды, миграции и старт воркера не тянут boto3 и не открывают соединений.
+После fork (gunicorn --preload, multiprocessing) клиент в дочернем процессе создаётся заново.
+"""
+import os
+
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject, empty
+
+
+class ProcessLocal(SimpleLazyObject):
+    """Объект из factory, созданный при первом обращении в этом процессе"""
+
+    def __init__(self, factory):
+        super().__init__(factory)
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._wrapped = empty
+
+    def __bool__(self):
+        #FileField проверяет storage через `or`, создавать ради этого клиент не нужно
+        return True
+
+
+def create_image_storage():
+    from django.core.files.storage import storages
+    #не storages['images']: тот кеширует экземпляр на весь процесс, в том числе через fork
+    return storages.create_storage(settings.STORAGES['images'])
+
+
+def create_redis(url):
+    import redis
+    return redis.Redis.from_url(url)
+
+
+image_storage = ProcessLocal(create_image_storage)
@@ -0,0 +1,148 @@
+"""
+Рассылка изменений задач повара (SSE вместо опроса CookTaskListView).
+Публиковать можно из любого воркера: через redis pub/sub, а если
+COOK_EVENTS_REDIS_URL не задан - через брокер внутри процесса.
+"""
+import asyncio
+import json
+import threading
+from functools import partial
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from pizza_lab.clients import ProcessLocal, create_redis
+from pizza_lab.models import ProductInOrder
+
+CHANNEL_PREFIX = 'cook_tasks'
+#комментарий-пинг, чтобы прокси не закрывали простаивающее соединение
+HEARTBEAT_SECONDS = 15
+
+
+def channel_name(cook_id):
+    return f'{CHANNEL_PREFIX}:{cook_id}'
+
+
+def task_payload(entry):
+    """
+    Задача повара в том же виде, что и элемент ответа CookTaskListView.
+    pizza_image здесь - путь: при публикации запроса нет, абсолютной ссылку делает stream_events.
+    """
+    return {
+        'pizza_id': entry.product.id,
+        'pizza_name': entry.product.name,
+        'pizza_image': entry.product.image.url if entry.product.image else None,
+        'order_id': entry.order.id,
+        'formation_datetime': entry.order.formation_datetime,
+        'remaining_to_cook': entry.quantity - entry.end_quantity,
+    }
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, message)
+
+    async def listen(self, channel):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscriber)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscriber[1].get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(subscriber)
+
+
+class RedisBroker:
+    def __init__(self, url):
+        self.url = url
+        self._client = ProcessLocal(partial(create_redis, url))
+
+    def publish(self, channel, message):
+        self._client.publish(channel, message)
+
+    async def listen(self, channel):
+        import redis.asyncio
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(channel)
+        try:
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=HEARTBEAT_SECONDS)
+                yield message['data'].decode() if message else None
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+            await client.aclose()
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        url = getattr(settings, 'COOK_EVENTS_REDIS_URL', None)
+        _broker = RedisBroker(url) if url else InProcessBroker()
+    return _broker
+
+
+def publish(cook_id, event, data):
+    message = json.dumps({'event': event, 'data': data}, cls=DjangoJSONEncoder)
+    get_broker().publish(channel_name(cook_id), message)
+
+
+async def stream_events(cook_id, build_absolute_uri):
+    """Поток text/event-stream для одного повара; build_absolute_uri - у запроса подписчика"""
+    yield 'retry: 3000\n\n'
+    async for message in get_broker().listen(channel_name(cook_id)):
+        if message is None:
+            yield ': ping\n\n'
+            continue
+        payload = json.loads(message)
+        if payload['data'].get('pizza_image'):
+            payload['data']['pizza_image'] = build_absolute_uri(payload['data']['pizza_image'])
+        yield f"event: {payload['event']}\ndata: {json.dumps(payload['data'])}\n\n"
+
+
+def on_orders_formed(order_ids):
+    def send():
+        entries = ProductInOrder.objects.filter(
+            order_id__in=order_ids,
+            product__cook__isnull=False,
+        ).select_related('product', 'order')
+        for entry in entries:
+            publish(entry.product.cook_id, 'task_added', task_payload(entry))
+    #robust: сбой брокера пишется в лог и не превращает уже зафиксированный запрос в 500
+    transaction.on_commit(send, robust=True)
+
+
+def on_orders_closed(order_ids):
+    def send():
+        pairs = ProductInOrder.objects.filter(
+            order_id__in=order_ids,
+            product__cook__isnull=False,
+        ).values_list('order_id', 'product__cook_id').distinct()
+        for order_id, cook_id in pairs:
+            publish(cook_id, 'order_closed', {'order_id': order_id})
+    transaction.on_commit(send, robust=True)
+
+
+def on_task_progress(cook_id, order_id, pizza_id, remaining):
+    if cook_id is None:
+        return
+    event = 'task_updated' if remaining > 0 else 'task_removed'
+    data = {'order_id': order_id, 'pizza_id': pizza_id, 'remaining_to_cook': remaining}
+    transaction.on_commit(lambda: publish(cook_id, event, data), robust=True)
@@ -0,0 +1,41 @@
+"""
+Метрики соединений с бд для мониторинга.
+connects - сколько раз django открыл соединение: с пулом это выдачи из пула, без пула - новые
+подключения (их рост при постоянных соединениях значит, что CONN_MAX_AGE не работает).
+Для алиасов с пулом psycopg добавляется его статистика: ожидания, таймауты, размер пула.
+"""
+import threading
+from collections import Counter
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_lock = threading.Lock()
+_connects = Counter()
+
+
+@receiver(connection_created)
+def count_connect(sender, connection, **kwargs):
+    with _lock:
+        _connects[connection.alias] += 1
+
+
+def pool_stats():
+    """Счётчики этого процесса по каждому алиасу из DATABASES"""
+    stats = {}
+    for alias in connections:
+        wrapper = connections[alias]
+        entry = {
+            'vendor': wrapper.vendor,
+            'conn_max_age': wrapper.settings_dict['CONN_MAX_AGE'],
+            'health_checks': wrapper.settings_dict['CONN_HEALTH_CHECKS'],
+            'connects': _connects[alias],
+        }
+        #свойство pool есть только у postgresql-бэкенда и равно None без OPTIONS['pool']
+        pool = getattr(wrapper, 'pool', None)
+        if pool is not None:
+            #requests_num - выдачи, requests_queued/requests_wait_ms - ожидания, requests_errors - таймауты
+            entry['pool'] = pool.get_stats()
+        stats[alias] = entry
+    return stats
@@ -0,0 +1,113 @@
+import random
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.deprecation import MiddlewareMixin
+
+PIN_KEY_PREFIX = 'db:pin'
+
+#разрешено ли текущему запросу читать с реплики; выставляется только для безопасных эндпоинтов
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def pin_to_primary(user_id):
+    """После записи пользователь какое-то время читает с основной базы (read-your-writes)"""
+    cache.set(f'{PIN_KEY_PREFIX}:{user_id}', 1, timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    return bool(user and user.is_authenticated and cache.get(f'{PIN_KEY_PREFIX}:{user.id}'))
+
+
+def can_read_from_replica(request):
+    return bool(get_replicas()) and request.method in ('GET', 'HEAD') and not is_pinned(request.user)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        replicas = get_replicas()
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        #схему на реплики доставляет репликация
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaReadMixin:
+    """
+    Для APIView/ViewSet: чтения из actions в replica_actions (None - все GET) идут на реплику.
+    Решение принимается после аутентификации, чтобы учесть закрепление пользователя за основной базой.
+    """
+    replica_actions = None
+
+    def dispatch(self, request, *args, **kwargs):
+        token = _replica_reads.set(False)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        action = getattr(self, 'action', None)
+        if (self.replica_actions is None or action in self.replica_actions) and can_read_from_replica(request):
+            _replica_reads.set(True)
+
+
+def replica_reads(view):
+    """То же для обычных django-представлений"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _replica_reads.set(can_read_from_replica(request))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+    return wrapper
+
+
+def areplica_reads(view):
+    """То же для async-представлений; request.user к этому моменту уже должен быть известен"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        allowed = bool(get_replicas()) and request.method in ('GET', 'HEAD')
+        if allowed:
+            allowed = not await sync_to_async(is_pinned)(request.user)
+        token = _replica_reads.set(allowed)
+        try:
+            return await view(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+    return wrapper
+
+
+class ReplicaPinningMiddleware(MiddlewareMixin):
+    #MiddlewareMixin поддерживает и sync, и async цепочку, async-представления не переводятся в поток
+    def process_response(self, request, response):
+        user = getattr(request, 'user', None)
+        if (
+            get_replicas()
+            and request.method not in ('GET', 'HEAD', 'OPTIONS')
+            and response.status_code < 400
+            and user is not None
+            and user.is_authenticated
+        ):
+            pin_to_primary(user.id)
+        return response
@@ -0,0 +1,82 @@
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+#сколько строк читать из серверного курсора за раз
+EXPORT_CHUNK_SIZE = 2000
+
+#колонка выгрузки -> поле в values(); одна строка на позицию заказа
+EXPORT_COLUMNS = [
+    ('order_id', 'id'),
+    ('status', 'status'),
+    ('creation_datetime', 'creation_datetime'),
+    ('formation_datetime', 'formation_datetime'),
+    ('completion_datetime', 'completion_datetime'),
+    ('client', 'client__username'),
+    ('manager', 'manager__username'),
+    ('product_id', 'productinorder__product_id'),
+    ('product_name', 'productinorder__product__name'),
+    ('price', 'productinorder__product__price'),
+    ('quantity', 'productinorder__quantity'),
+    ('end_quantity', 'productinorder__end_quantity'),
+]
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Echo:
+    """Псевдо-файл для csv.writer: отдаёт строку вместо записи в буфер"""
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset):
+    fields = [field for _, field in EXPORT_COLUMNS]
+    return (
+        queryset.prefetch_related(None)
+        .order_by('formation_datetime', 'id', 'productinorder__id')
+        .values_list(*fields)
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([column for column, _ in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_ndjson(rows):
+    columns = [column for column, _ in EXPORT_COLUMNS]
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def iter_export(queryset, export_format):
+    rows = export_rows(queryset)
+    if export_format == 'ndjson':
+        return iter_ndjson(rows)
+    return iter_csv(rows)
+
+
+async def aiter_export(queryset, export_format):
+    """
+    iter_export для ASGI: синхронный итератор django вычитал бы в список целиком,
+    поэтому строки читаются блоками по EXPORT_CHUNK_SIZE, каждый - в своём sync_to_async.
+    Вызовы идут в одном потоке запроса, поэтому серверный курсор живёт между блоками.
+    """
+    lines = iter_export(queryset, export_format)
+    next_block = sync_to_async(lambda: ''.join(islice(lines, EXPORT_CHUNK_SIZE)))
+    try:
+        while block := await next_block():
+            yield block
+    finally:
+        #клиент мог оборвать загрузку - курсор закрываем в том же потоке
+        await sync_to_async(lines.close)()
@@ -0,0 +1,132 @@
+"""
+Хеширование паролей вне event loop: argon2 с параметрами из настроек, отдельный ограниченный пул потоков
+и ограничение одновременных входов с одного IP и на один логин.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.cache import cache
+from django.db import close_old_connections
+
+LIMIT_KEY_PREFIX = 'login:inflight'
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """
+    Параметры берутся из ARGON2_*. Хеши с другими параметрами (и PBKDF2) пересчитываются
+    при следующем успешном входе - это делает check_password.
+    """
+    def __init__(self):
+        self.time_cost = settings.ARGON2_TIME_COST
+        self.memory_cost = settings.ARGON2_MEMORY_COST
+        self.parallelism = settings.ARGON2_PARALLELISM
+
+
+class HashingOverloaded(Exception):
+    """Очередь на хеширование в этом процессе переполнена"""
+
+
+class LoginThrottled(Exception):
+    """С этого IP или на этот логин уже идёт слишком много входов"""
+
+
+_executor = None
+_pending = 0
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash')
+    return _executor
+
+
+def call_and_close(func, *args, **kwargs):
+    #потоки пула живут долго, поэтому соединение с бд закрываем по правилам CONN_MAX_AGE, как после запроса
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_hashing(func, *args, **kwargs):
+    """Выполняет func (authenticate, create_user, ...) в пуле PASSWORD_HASH_WORKERS потоков"""
+    global _pending
+    if _pending >= settings.PASSWORD_HASH_MAX_PENDING:
+        raise HashingOverloaded()
+    _pending += 1
+    try:
+        return await sync_to_async(
+            partial(call_and_close, func, *args, **kwargs),
+            thread_sensitive=False,
+            executor=get_executor(),
+        )()
+    finally:
+        _pending -= 1
+
+
+def client_ip(request):
+    """
+    Адрес клиента. За TRUSTED_PROXY_COUNT прокси - из X-Forwarded-For: каждый прокси дописывает в конец адрес,
+    с которого пришёл запрос, поэтому клиент - N-й адрес с конца, а то, что левее, мог подставить сам клиент.
+    """
+    proxies = settings.TRUSTED_PROXY_COUNT
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    if proxies and forwarded:
+        addresses = [address.strip() for address in forwarded.split(',') if address.strip()]
+        if addresses:
+            return addresses[-min(proxies, len(addresses))]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def take_slots(limits):
+    """
+    Увеличивает счётчики; возвращает (занятые ключи, превышен ли лимит).
+    Синхронно: incr в django_redis атомарный, а async-версии кеша - get+set.
+    """
+    taken = []
+    for key, limit in limits:
+        #ttl страхует от счётчика, который не уменьшили из-за падения воркера
+        cache.add(key, 0, timeout=settings.LOGIN_SLOT_TIMEOUT)
+        try:
+            count = cache.incr(key)
+        except ValueError:
+            #ключ истёк между add и incr
+            continue
+        if count is None:
+            continue
+        taken.append(key)
+        if count > limit:
+            return taken, True
+    return taken, False
+
+
+def release_slots(keys):
+    for key in keys:
+        try:
+            cache.decr(key)
+        except ValueError:
+            pass
+
+
+@asynccontextmanager
+async def login_slot(ip, username):
+    """
+    Занимает место среди одновременных входов с ip и на username (счётчики в redis, общие для воркеров).
+    Если redis недоступен, ограничение не применяется.
+    """
+    limits = [
+        (f'{LIMIT_KEY_PREFIX}:ip:{ip}', settings.LOGIN_MAX_CONCURRENT_PER_IP),
+        (f'{LIMIT_KEY_PREFIX}:user:{username.lower()}', settings.LOGIN_MAX_CONCURRENT_PER_USERNAME),
+    ]
+    taken, throttled = await sync_to_async(take_slots)(limits)
+    try:
+        if throttled:
+            raise LoginThrottled()
+        yield
+    finally:
+        await sync_to_async(release_slots)(taken)
@@ -0,0 +1,146 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import FileSystemStorage
+from PIL import Image, ImageOps, features
+
+from pizza_lab.clients import image_storage
+from pizza_lab.jobs import job
+
+#ширины производных картинок; больше оригинала не увеличиваем
+VARIANT_WIDTHS = (320, 640, 1280)
+#ширина, которую отдаём карточкам каталога
+THUMBNAIL_WIDTH = 640
+
+#фон под прозрачными местами в jpeg
+JPEG_BACKGROUND = (255, 255, 255, 255)
+
+SAVE_OPTIONS = {
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 6},
+    'avif': {'format': 'AVIF', 'quality': 60},
+}
+
+
+def variant_formats():
+    formats = ['jpeg', 'webp']
+    if features.check('avif'):
+        formats.append('avif')
+    return formats
+
+
+def variant_widths(original_width):
+    widths = [width for width in VARIANT_WIDTHS if width < original_width]
+    return widths or [original_width]
+
+
+def encode(image, image_format):
+    if image_format == 'jpeg' and image.mode != 'RGB':
+        #у jpeg нет прозрачности: прозрачные места заливаем фоном, а не тем цветом, что лежит под альфой
+        background = Image.new('RGBA', image.size, JPEG_BACKGROUND)
+        image = Image.alpha_composite(background, image.convert('RGBA')).convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, **SAVE_OPTIONS[image_format])
+    return buffer.getvalue()
+
+
+def delete_variants(storage, variants):
+    for names in (variants or {}).values():
+        for name in names.values():
+            storage.delete(name)
+
+
+def generate_variants(pizza):
+    """
+    Строит уменьшенные копии pizza.image во всех форматах и кладёт их рядом с оригиналом.
+    Возвращает {формат: {ширина: имя файла в хранилище}}.
+    """
+    storage = pizza.image.storage
+    with pizza.image.open('rb') as original:
+        image = ImageOps.exif_transpose(Image.open(original))
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        #прозрачность палитровых картинок хранится в info, а не в отдельном канале
+        image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+    #exif и icc оригинала в копии не переносим: часть кодеков берёт их из info сама
+    image.info = {}
+
+    stem = os.path.splitext(pizza.image.name)[0]
+    directory, filename = os.path.split(stem)
+    variants = {}
+    for width in variant_widths(image.width):
+        height = round(image.height * width / image.width)
+        resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+        for image_format in variant_formats():
+            name = f'{directory}/derived/{filename}_{width}.{image_format}'
+            saved_name = storage.save(name, ContentFile(encode(resized, image_format)))
+            variants.setdefault(image_format, {})[str(width)] = saved_name
+    return variants
+
+
+@job('pizza.delete_variants')
+def delete_pizza_variants(variants):
+    """Удаляет из хранилища производные копии очищенной картинки"""
+    delete_variants(image_storage, variants)
+    return None
+
+
+def process_pizza_image(pizza):
+    """Пересобирает производные картинки пиццы и сохраняет их имена в image_variants"""
+    from pizza_lab.menu_cache import bump_menu_version
+    from pizza_lab.models import Pizza
+
+    storage = pizza.image.storage
+    delete_variants(storage, pizza.image_variants)
+    variants = generate_variants(pizza) if pizza.image else {}
+    Pizza.objects.filter(id=pizza.id).update(image_variants=variants)
+    pizza.image_variants = variants
+    bump_menu_version()
+    return variants
+
+
+def staging_storage():
+    #локальная папка, общая для веб-воркеров и run_jobs
+    return FileSystemStorage(location=settings.JOBS_STAGING_DIR)
+
+
+def stage_image(upload):
+    """Сохраняет загруженный файл локально; в хранилище его отправит задача pizza.store_image"""
+    return staging_storage().save(os.path.basename(upload.name), upload)
+
+
+@job('pizza.store_image')
+def store_pizza_image(pizza_id, staged_name):
+    """Загружает подготовленную картинку в хранилище и строит её производные копии"""
+    from pizza_lab.models import Pizza
+
+    staging = staging_storage()
+    pizza = Pizza.objects.filter(id=pizza_id).first()
+    if pizza is None:
+        staging.delete(staged_name)
+        return None
+    with staging.open(staged_name, 'rb') as staged:
+        pizza.image.save(os.path.basename(staged_name), File(staged), save=False)
+    Pizza.objects.filter(id=pizza_id).update(image=pizza.image.name)
+    process_pizza_image(pizza)
+    staging.delete(staged_name)
+    return {'image': pizza.image.name}
+
+
+def variant_urls(pizza):
+    storage = pizza.image.storage
+    return {
+        image_format: {width: storage.url(name) for width, name in names.items()}
+        for image_format, names in (pizza.image_variants or {}).items()
+    }
+
+
+def thumbnail_url(pizza):
+    urls = variant_urls(pizza)
+    for image_format in ('webp', 'jpeg'):
+        by_width = urls.get(image_format)
+        if by_width:
+            return by_width.get(str(THUMBNAIL_WIDTH)) or by_width[min(by_width, key=int)]
+    return None
@@ -0,0 +1,134 @@
+"""
+Очередь фоновых задач в таблице Job.
+Представление ставит задачу через enqueue и сразу отвечает, воркер (manage.py run_jobs)
+забирает задачи через SELECT ... FOR UPDATE SKIP LOCKED, поэтому воркеров может быть несколько.
+При JOBS_EAGER = True задача выполняется сразу в вызывающем потоке - для тестов и локального запуска.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from pizza_lab.models import Job
+
+logger = logging.getLogger(__name__)
+
+Status = Job.JobStatus
+
+_handlers = {}
+
+
+def job(name):
+    """Регистрирует функцию как задачу с именем name; аргументы задачи - именованные и сериализуемые в json"""
+    def register(func):
+        _handlers[name] = func
+        return func
+    return register
+
+
+def autodiscover():
+    #модули с задачами должны быть импортированы и в веб-воркере, и в run_jobs
+    for module in getattr(settings, 'JOB_MODULES', []):
+        import_module(module)
+
+
+def get_handler(name):
+    if name not in _handlers:
+        autodiscover()
+    try:
+        return _handlers[name]
+    except KeyError:
+        raise KeyError(f'Unknown job {name!r}')
+
+
+def enqueue(name, user=None, max_attempts=None, **kwargs):
+    """
+    Ставит задачу в очередь и возвращает Job.
+    Внутри транзакции задача станет видна воркеру только после коммита.
+    """
+    get_handler(name)  #опечатка в имени задачи должна падать сразу, а не в воркере
+    job = Job.objects.create(
+        name=name,
+        kwargs=kwargs,
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+    if settings.JOBS_EAGER:
+        while job.status == Status.QUEUED:
+            start_job(job)
+            run_job(job)
+    return job
+
+
+def retry_delay(attempts):
+    """Экспоненциальная задержка перед повтором с небольшим разбросом"""
+    delay = min(settings.JOBS_RETRY_BASE_SECONDS * 2 ** (attempts - 1), settings.JOBS_RETRY_MAX_SECONDS)
+    return timedelta(seconds=delay * random.uniform(1, 1.1))
+
+
+def start_job(job):
+    job.status = Status.RUNNING
+    job.attempts += 1
+    job.locked_at = timezone.now()
+    job.save(update_fields=['status', 'attempts', 'locked_at'])
+
+
+def claim_job():
+    """Забирает следующую готовую к запуску задачу; None, если очередь пуста"""
+    while True:
+        now = timezone.now()
+        stale = now - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT)
+        with transaction.atomic():
+            job = (
+                Job.objects.select_for_update(skip_locked=True)
+                .filter(
+                    Q(status=Status.QUEUED, run_after__lte=now)
+                    #задачи воркера, который упал, не закончив их
+                    | Q(status=Status.RUNNING, locked_at__lt=stale)
+                )
+                .order_by('run_after', 'id')
+                .first()
+            )
+            if job is None:
+                return None
+            if job.status == Status.RUNNING and job.attempts >= job.max_attempts:
+                finish_job(job, Status.FAILED, error='Воркер не завершил задачу за JOBS_LOCK_TIMEOUT')
+                continue
+            start_job(job)
+            return job
+
+
+def finish_job(job, status, result=None, error=''):
+    job.status = status
+    job.result = result
+    job.error = error
+    job.locked_at = None
+    job.completion_datetime = timezone.now()
+    job.save(update_fields=['status', 'result', 'error', 'locked_at', 'completion_datetime'])
+
+
+def run_job(job):
+    """Выполняет взятую задачу; при ошибке планирует повтор или помечает FAILED"""
+    try:
+        result = get_handler(job.name)(**job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            logger.warning('Job %s failed (attempt %s), retrying', job, job.attempts, exc_info=True)
+            job.status = Status.QUEUED
+            job.error = error
+            job.locked_at = None
+            job.run_after = timezone.now() + retry_delay(job.attempts)
+            job.save(update_fields=['status', 'error', 'locked_at', 'run_after'])
+        else:
+            logger.error('Job %s failed after %s attempts', job, job.attempts, exc_info=True)
+            finish_job(job, Status.FAILED, error=error)
+        return False
+    finish_job(job, Status.DONE, result=result)
+    return True
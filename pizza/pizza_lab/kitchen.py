@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Value, When, BooleanField
+
+from pizza_lab import cook_events
+from pizza_lab.metrics import record_cooked
+from pizza_lab.models import Order_pizza, ProductInOrder
+from pizza_lab.progress import add_cooked
+from pizza_lab.transitions import transition_order
+
+INCREMENTED = 'incremented'
+ALREADY_COOKED = 'already_cooked'
+NOT_FOUND = 'not_found'
+
+
+def cook_tasks(cook):
+    """Недоготовленные позиции сформированных заказов повара; остаток считает бд"""
+    return ProductInOrder.objects.filter(
+        order__status='FORMED',
+        product__cook=cook,
+        end_quantity__lt=F('quantity'),
+    ).annotate(
+        remaining=F('quantity') - F('end_quantity'),
+    ).select_related('product', 'order').only(
+        'quantity', 'end_quantity',
+        'product__id', 'product__name', 'product__image', 'product__cook_id',
+        'order__id', 'order__formation_datetime',
+    ).order_by('order__formation_datetime', 'id')
+
+
+def increment_cooked(order_id, product_id, count=1):
+    """
+    Атомарно прибавляет count к end_quantity, не выходя за quantity, и пересчитывает is_ready.
+    Возвращает (статус, остаток).
+    """
+    products = ProductInOrder.objects.filter(order_id=order_id, product_id=product_id)
+    with transaction.atomic():
+        updated = products.filter(end_quantity__lte=F('quantity') - count).update(
+            end_quantity=F('end_quantity') + count,
+            is_ready=Case(
+                When(end_quantity__gte=F('quantity') - count, then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+        )
+        row = products.values('quantity', 'end_quantity', 'product__cook_id').first()
+        if row is None:
+            return NOT_FOUND, None
+
+        remaining = row['quantity'] - row['end_quantity']
+        if not updated:
+            return ALREADY_COOKED, remaining
+
+        cook_events.on_task_progress(row['product__cook_id'], order_id, product_id, remaining)
+        record_cooked(count)
+        if add_cooked(order_id, count) and settings.ORDER_AUTO_COMPLETE:
+            #последняя пицца приготовлена: заказ завершается без менеджера
+            transition_order(Order_pizza(id=order_id), Order_pizza.OrderStatus.COMPLETED)
+    return INCREMENTED, remaining
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import statistics
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from pizza import urls
+from pizza_lab.models import CustomUser
+
+DEFAULT_PATHS = ['/api/pizzas/', '/api/pizzas/{pizza_id}/', '/api/orders/user_orders/', '/api/cook/tasks/']
+
+
+def urlconf(name, urlpatterns):
+    module = types.ModuleType(name)
+    module.urlpatterns = urlpatterns
+    return module
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает sync (WSGI) и async (ASGI) версии горячих GET-эндпоинтов в одном процессе на текущей бд'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='От чьего имени запрашивать (по умолчанию анонимно)')
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на эндпоинт')
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--pizza-id', type=int, default=1)
+        parser.add_argument('--path', action='append', dest='paths', help='Свой путь; можно несколько раз')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['username']:
+            user = CustomUser.objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(f"User {options['username']} not found")
+        paths = [path.format(pizza_id=options['pizza_id']) for path in options['paths'] or DEFAULT_PATHS]
+
+        setup_test_environment()
+        #ответы 4xx не должны засорять вывод
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            for path in paths:
+                with override_settings(ROOT_URLCONF=urlconf('bench_sync_urls', urls.sync_urlpatterns)):
+                    sync_timings = self.run_sync(path, user, options['requests'], options['concurrency'])
+                with override_settings(ROOT_URLCONF=urlconf('bench_async_urls', urls.async_urlpatterns + urls.sync_urlpatterns)):
+                    async_timings = asyncio.run(self.run_async(path, user, options['requests'], options['concurrency']))
+                self.report(path, 'sync', *sync_timings)
+                self.report(path, 'async', *async_timings)
+        finally:
+            request_logger.setLevel(level)
+            teardown_test_environment()
+
+    def run_sync(self, path, user, count, concurrency):
+        logged_in = Client()
+        if user is not None:
+            logged_in.force_login(user)
+
+        def request(_):
+            client = Client()
+            client.cookies = logged_in.cookies
+            started = time.perf_counter()
+            response = client.get(path)
+            elapsed = time.perf_counter() - started
+            connections.close_all()
+            return response.status_code, elapsed
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(request, range(count)))
+        return results, time.perf_counter() - started
+
+    async def run_async(self, path, user, count, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        client = AsyncClient()
+        if user is not None:
+            await sync_to_async(client.force_login)(user)
+
+        async def request():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(path)
+                return response.status_code, time.perf_counter() - started
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(request() for _ in range(count)))
+        return results, time.perf_counter() - started
+
+    def report(self, path, mode, results, total):
+        latencies = sorted(elapsed for _, elapsed in results)
+        statuses = sorted({code for code, _ in results})
+        p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+        self.stdout.write(
+            f'{path:32} {mode:5}  {len(results) / total:8.1f} req/s  '
+            f'p50 {statistics.median(latencies) * 1000:7.1f} ms  p95 {p95 * 1000:7.1f} ms  status {statuses}'
+        )
@@ -0,0 +1,89 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+#модули, которые должны загружаться при первом обращении, а не при старте воркера
+LAZY_MODULES = ['boto3', 'botocore', 'storages.backends.s3', 'drf_yasg.views', 'drf_yasg.generators']
+
+#старт воркера: модуль приложения и ROOT_URLCONF, который иначе импортируется первым запросом
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+from importlib import import_module
+import_module(sys.argv[1])
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - started
+print(json.dumps({'seconds': elapsed, 'loaded': [name for name in json.loads(sys.argv[2]) if name in sys.modules]}))
+'''
+
+
+def parse_importtime(stderr):
+    """[(накопленное время в мкс, модуль)] для модулей верхнего уровня из вывода -X importtime"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.startswith('  '):  #вложенный импорт, уже учтён в родителе
+            continue
+        modules.append((int(cumulative), name.strip()))
+    return modules
+
+
+class Command(BaseCommand):
+    help = 'Время холодного старта воркера (импорт приложения и urls) в отдельных процессах; падает, если превышен бюджет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--asgi', action='store_true', help='Запускать pizza.asgi вместо WSGI_APPLICATION')
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--budget-ms', type=float, default=1000, help='Допустимая медиана времени старта')
+        parser.add_argument('--top', type=int, default=15, help='Сколько самых долгих импортов показать')
+
+    def handle(self, *args, **options):
+        if options['asgi']:
+            module = settings.WSGI_APPLICATION.rsplit('.', 2)[0] + '.asgi'
+        else:
+            module = settings.WSGI_APPLICATION.rsplit('.', 1)[0]
+
+        timings = [self.run_child(module)['seconds'] for _ in range(options['runs'])]
+        #отдельный прогон с -X importtime: он сам замедляет импорт и в медиану не входит
+        profiled = self.run_child(module, importtime=True)
+
+        self.stdout.write(f'{module}: самые долгие импорты')
+        for cumulative, name in sorted(profiled['modules'], reverse=True)[:options['top']]:
+            self.stdout.write(f'  {cumulative / 1000:8.1f} ms  {name}')
+
+        median = statistics.median(timings) * 1000
+        self.stdout.write(
+            f'старт: медиана {median:.1f} ms, min {min(timings) * 1000:.1f} ms, max {max(timings) * 1000:.1f} ms '
+            f'({len(timings)} запусков), бюджет {options["budget_ms"]:.0f} ms'
+        )
+
+        errors = []
+        if profiled['loaded']:
+            errors.append(f'при старте загружены ленивые модули: {", ".join(profiled["loaded"])}')
+        if median > options['budget_ms']:
+            errors.append(f'медиана старта {median:.1f} ms больше бюджета {options["budget_ms"]:.0f} ms')
+        if errors:
+            raise CommandError('; '.join(errors))
+        self.stdout.write(self.style.SUCCESS('OK'))
+
+    def run_child(self, module, importtime=False):
+        command = [sys.executable]
+        if importtime:
+            command += ['-X', 'importtime']
+        command += ['-c', CHILD, module, json.dumps(LAZY_MODULES)]
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'pizza.settings')}
+        process = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        if process.returncode != 0:
+            raise CommandError(f'{module} не запустился:\n{process.stderr}')
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        if importtime:
+            result['modules'] = parse_importtime(process.stderr)
+        return result
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from pizza_lab import api_schema
+
+
+class Command(BaseCommand):
+    help = 'Строит схему OpenAPI для текущей версии кода и записывает её в API_SCHEMA_DIR (json и yaml)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Перестроить, даже если файлы этой версии уже есть')
+        parser.add_argument('--prune', action='store_true', help='Удалить схемы других версий')
+
+    def handle(self, *args, **options):
+        version = api_schema.code_version()
+        paths = [api_schema.schema_path(fmt) for fmt in api_schema.FORMATS]
+        if options['force'] or not all(path.exists() for path in paths):
+            paths = api_schema.write_schema(api_schema.generate_schema())
+            for path in paths:
+                self.stdout.write(f'{path} ({path.stat().st_size} bytes)')
+        else:
+            self.stdout.write(f'Schema for version {version} is up to date.')
+
+        if options['prune']:
+            for path in paths[0].parent.glob('openapi-*.*'):
+                if path not in paths:
+                    path.unlink()
+                    self.stdout.write(f'Removed {path}')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from pizza_lab.images import process_pizza_image
+from pizza_lab.models import Pizza
+
+
+class Command(BaseCommand):
+    help = 'Строит уменьшенные и webp/avif-копии картинок пицц, у которых их ещё нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Пересобрать и уже готовые копии')
+
+    def handle(self, *args, **options):
+        pizzas = Pizza.objects.exclude(image='').exclude(image__isnull=True).order_by('id')
+        if not options['force']:
+            pizzas = pizzas.filter(image_variants={})
+
+        processed = 0
+        for pizza in pizzas.iterator():
+            try:
+                process_pizza_image(pizza)
+            except Exception as error:
+                self.stderr.write(f'Pizza {pizza.id}: {error}')
+                continue
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} pizza images.'))
@@ -0,0 +1,23 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pizza_lab.reports import rebuild_sales
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает дневную сводку продаж (DailyPizzaSales) по истории заказов; продажи относятся к текущему повару пиццы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='Первый день, YYYY-MM-DD')
+        parser.add_argument('--end', help='Последний день, YYYY-MM-DD')
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+            end = date.fromisoformat(options['end']) if options['end'] else None
+        except ValueError as error:
+            raise CommandError(error)
+
+        created = rebuild_sales(start, end)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} daily sales rows.'))
@@ -0,0 +1,59 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connection
+
+from pizza_lab.jobs import autodiscover, claim_job, run_job
+
+
+class Command(BaseCommand):
+    help = 'Воркер фоновых задач: выполняет задачи из таблицы Job в нескольких потоках'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.JOBS_CONCURRENCY, help='Число потоков')
+        parser.add_argument('--once', action='store_true', help='Выйти, когда очередь опустеет')
+
+    def handle(self, *args, **options):
+        autodiscover()
+        self.stop = threading.Event()
+        self.processed = 0
+        self.lock = threading.Lock()
+        #по SIGTERM/SIGINT дорабатываем текущие задачи и выходим
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: self.stop.set())
+
+        threads = [
+            threading.Thread(target=self.work, args=(options['once'],), name=f'job-worker-{number}')
+            for number in range(max(options['concurrency'], 1))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=1)
+        self.stdout.write(self.style.SUCCESS(f'Processed {self.processed} jobs.'))
+
+    def work(self, once):
+        #у каждого потока своё соединение с бд
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                try:
+                    job = claim_job()
+                except DatabaseError as error:
+                    #бд недоступна или перезапускается - поток не роняем
+                    self.stderr.write(f'Cannot claim job: {error}')
+                    self.stop.wait(settings.JOBS_POLL_SECONDS)
+                    continue
+                if job is None:
+                    if once:
+                        break
+                    self.stop.wait(settings.JOBS_POLL_SECONDS)
+                    continue
+                run_job(job)
+                with self.lock:
+                    self.processed += 1
+        finally:
+            connection.close()
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from pizza_lab.models import Order_pizza
+
+MENU_VERSION_KEY = 'menu:version'
+MENU_KEY_PREFIX = 'menu:list'
+DRAFT_KEY_PREFIX = 'menu:draft'
+
+#параметры запроса, от которых зависит тело меню
+MENU_VARY_PARAMS = ('search', 'ordering', 'is_vegetarian')
+
+
+def get_menu_version():
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        #ключ мог быть вытеснен: начинаем с метки времени, чтобы не попасть на старые записи
+        cache.add(MENU_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(MENU_VERSION_KEY)
+    return version
+
+
+def bump_menu_version():
+    """Инвалидирует все закешированные варианты меню"""
+    try:
+        cache.incr(MENU_VERSION_KEY)
+    except ValueError:
+        cache.set(MENU_VERSION_KEY, int(time.time() * 1000), timeout=None)
+
+
+def menu_cache_key(request):
+    #request из DRF или обычный HttpRequest (async-представления)
+    query = getattr(request, 'query_params', request.GET)
+    params = [(name, query.get(name, '')) for name in MENU_VARY_PARAMS]
+    user = request.user
+    cook_id = user.id if user.is_authenticated and getattr(user, 'is_cook', False) else ''
+    #ссылки на картинки абсолютные, поэтому хост тоже входит в ключ
+    variant = json.dumps([request.build_absolute_uri('/'), cook_id, params])
+    digest = hashlib.sha1(variant.encode()).hexdigest()
+    return f'{MENU_KEY_PREFIX}:{get_menu_version()}:{digest}'
+
+
+def get_menu(key):
+    return cache.get(key)
+
+
+def set_menu(key, pizzas):
+    body = json.dumps(pizzas, cls=DjangoJSONEncoder, sort_keys=True)
+    entry = {
+        'pizzas': pizzas,
+        'etag': hashlib.sha1(body.encode()).hexdigest(),
+    }
+    cache.set(key, entry, timeout=settings.MENU_CACHE_TIMEOUT)
+    return entry
+
+
+def make_etag(menu_etag, draft_order_id):
+    return f'"{menu_etag}-{draft_order_id or 0}"'
+
+
+def get_draft_order_id(user):
+    """id заявки-черновика пользователя; кешируется отдельно от общего тела меню"""
+    if not user.is_authenticated:
+        return None
+    key = f'{DRAFT_KEY_PREFIX}:{user.id}'
+    draft_order_id = cache.get(key)
+    if draft_order_id is None:
+        draft_order_id = Order_pizza.objects.filter(
+            client=user,
+            status=Order_pizza.OrderStatus.DRAFT
+        ).values_list('id', flat=True).first() or 0
+        cache.set(key, draft_order_id, timeout=settings.MENU_CACHE_TIMEOUT)
+    return draft_order_id or None
+
+
+async def aget_draft_order_id(user):
+    if not user.is_authenticated:
+        return None
+    key = f'{DRAFT_KEY_PREFIX}:{user.id}'
+    draft_order_id = await cache.aget(key)
+    if draft_order_id is None:
+        draft_order_id = await Order_pizza.objects.filter(
+            client=user,
+            status=Order_pizza.OrderStatus.DRAFT
+        ).values_list('id', flat=True).afirst() or 0
+        await cache.aset(key, draft_order_id, timeout=settings.MENU_CACHE_TIMEOUT)
+    return draft_order_id or None
+
+
+def forget_draft_order(user_id):
+    cache.delete(f'{DRAFT_KEY_PREFIX}:{user_id}')
@@ -0,0 +1,109 @@
+import threading
+import time
+from types import MappingProxyType
+from typing import NamedTuple, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from pizza_lab.images import thumbnail_url
+from pizza_lab.menu_cache import get_menu_version
+from pizza_lab.models import Pizza
+from singleton import SingletonMeta
+
+#версия ещё не собранного снимка; None - это ответ get_menu_version(), когда redis недоступен
+_NOT_BUILT = object()
+#без версии (redis недоступен) снимок собирается из бд и живёт столько секунд
+UNVERSIONED_TTL_SECONDS = 30
+
+
+class MenuItem(NamedTuple):
+    id: int
+    name: str
+    price: object
+    description: str
+    image_url: Optional[str]
+    thumbnail_url: Optional[str]
+    cook_id: Optional[int]
+    cook: Optional[str]
+    is_vegetarian: Optional[bool]
+    data: MappingProxyType  #готовое представление PizzaSerializer
+
+
+class MenuSnapshot(metaclass=SingletonMeta):
+    """
+    Неизменяемый снимок меню в памяти процесса. Версию меню в redis проверяем
+    не чаще раза в MENU_SNAPSHOT_POLL_SECONDS и пересобираем снимок, когда она сменилась.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = (_NOT_BUILT, MappingProxyType({}), ())
+        self._built_at = None
+        self._checked_at = None
+
+    def items(self):
+        return self._current()[2]
+
+    def get(self, pizza_id):
+        try:
+            pizza_id = int(pizza_id)
+        except (TypeError, ValueError):
+            return None
+        return self._current()[1].get(pizza_id)
+
+    async def aget(self, pizza_id):
+        """get для async-представлений: в поток уходим, только если пора сверить версию"""
+        try:
+            pizza_id = int(pizza_id)
+        except (TypeError, ValueError):
+            return None
+        if self._is_fresh():
+            return self._state[1].get(pizza_id)
+        return (await sync_to_async(self._current)())[1].get(pizza_id)
+
+    def _is_fresh(self):
+        return self._checked_at is not None and time.monotonic() - self._checked_at < settings.MENU_SNAPSHOT_POLL_SECONDS
+
+    def _current(self):
+        if self._is_fresh():
+            return self._state
+
+        now = time.monotonic()
+        version = get_menu_version()
+        if self._is_outdated(version, now):
+            with self._lock:
+                if self._is_outdated(version, now):
+                    self._state = self._build(version)
+                    self._built_at = now
+        self._checked_at = now
+        return self._state
+
+    def _is_outdated(self, version, now):
+        if version is None:
+            #изменения меню во время сбоя redis не видны, поэтому снимок без версии живёт недолго
+            return self._state[0] is not None or now - self._built_at >= UNVERSIONED_TTL_SECONDS
+        return version != self._state[0]
+
+    def _build(self, version):
+        from serializers import PizzaSerializer
+
+        #только с основной базы: реплика может отставать от уже увеличенной версии
+        pizzas = Pizza.objects.using(DEFAULT_DB_ALIAS).filter(deleted=False).select_related('cook').order_by('id')
+        items = tuple(
+            MenuItem(
+                id=pizza.id,
+                name=pizza.name,
+                price=pizza.price,
+                description=pizza.description,
+                image_url=pizza.image.url if pizza.image else None,
+                thumbnail_url=thumbnail_url(pizza),
+                cook_id=pizza.cook_id,
+                cook=pizza.cook.username if pizza.cook else None,
+                is_vegetarian=pizza.is_vegetarian,
+                data=MappingProxyType(dict(PizzaSerializer(pizza).data)),
+            )
+            for pizza in pizzas
+        )
+        return (version, MappingProxyType({item.id: item for item in items}), items)
@@ -0,0 +1,173 @@
+"""
+Метрики Prometheus: задержка и число ответов по маршрутам, соединения и пул бд, бизнес-счётчики
+(переходы заказов, приготовленные пиццы, изменения корзины). Отдаются представлением metrics_view на /metrics.
+
+Под gunicorn/uvicorn с несколькими воркерами задайте PROMETHEUS_MULTIPROC_DIR - пустой общий каталог,
+который очищается перед запуском. Тогда каждый воркер пишет значения в свои файлы, а /metrics
+в любом воркере суммирует их по всем процессам. Чтобы gauge упавших воркеров не оставались в сумме,
+в gunicorn.conf.py нужен хук:
+
+    def child_exit(server, worker):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+"""
+import ipaddress
+import os
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+from pizza_lab.db_pool import pool_stats
+from pizza_lab.hashers import client_ip
+from pizza_lab.perf import view_name
+
+REQUEST_LATENCY = Histogram(
+    'pizza_http_request_duration_seconds', 'Время ответа', ['method', 'route'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUESTS = Counter('pizza_http_requests', 'Ответы по коду статуса', ['method', 'route', 'status'])
+
+DB_CONNECTS = Counter('pizza_db_connects', 'Открытия соединений django (выдачи из пула или новые подключения)', ['alias'])
+DB_POOL_REQUESTS = Counter('pizza_db_pool_requests', 'Запросы соединения из пула', ['alias'])
+DB_POOL_QUEUED = Counter('pizza_db_pool_queued_requests', 'Запросы, которым пришлось ждать соединение', ['alias'])
+DB_POOL_WAIT = Counter('pizza_db_pool_wait_seconds', 'Суммарное ожидание соединения из пула', ['alias'])
+DB_POOL_TIMEOUTS = Counter('pizza_db_pool_timeouts', 'Запросы, не дождавшиеся соединения', ['alias'])
+DB_POOL_SIZE = Gauge('pizza_db_pool_size', 'Открытые соединения пула', ['alias'], multiprocess_mode='livesum')
+DB_POOL_AVAILABLE = Gauge('pizza_db_pool_available', 'Свободные соединения пула', ['alias'], multiprocess_mode='livesum')
+DB_POOL_WAITING = Gauge('pizza_db_pool_waiting', 'Запросы, ждущие соединение сейчас', ['alias'], multiprocess_mode='livesum')
+
+ORDER_TRANSITIONS = Counter('pizza_order_transitions', 'Переходы заказов по целевому статусу', ['status'])
+PIZZAS_COOKED = Counter('pizza_cooked_pizzas', 'Пиццы, отмеченные поваром как приготовленные')
+CART_MUTATIONS = Counter('pizza_cart_mutations', 'Изменения позиций корзины', ['operation'])
+
+#остальные методы идут в метку other, чтобы произвольный метод клиента не заводил новую серию
+HTTP_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+#как часто воркер переносит статистику бд в метрики; счётчики считаются по приращениям
+DB_STATS_INTERVAL = 1.0
+_db_lock = threading.Lock()
+_db_stats_at = 0.0
+_db_seen = {}
+
+
+def on_commit_inc(counter, amount=1):
+    #бизнес-события считаются только если транзакция зафиксирована
+    if amount:
+        transaction.on_commit(lambda: counter.inc(amount))
+
+
+def record_order_transitions(target, count):
+    on_commit_inc(ORDER_TRANSITIONS.labels(str(target).lower()), count)
+
+
+def record_cooked(count):
+    on_commit_inc(PIZZAS_COOKED, count)
+
+
+def record_cart_mutations(deltas):
+    added = sum(1 for delta in deltas.values() if delta > 0)
+    on_commit_inc(CART_MUTATIONS.labels('add'), added)
+    on_commit_inc(CART_MUTATIONS.labels('remove'), len(deltas) - added)
+
+
+def update_db_metrics(force=False):
+    global _db_stats_at
+    now = time.monotonic()
+    if not force and now - _db_stats_at < DB_STATS_INTERVAL:
+        return
+    #приращения считает один поток, остальные не ждут
+    if not _db_lock.acquire(blocking=force):
+        return
+    try:
+        _db_stats_at = now
+        copy_db_stats()
+    finally:
+        _db_lock.release()
+
+
+def copy_db_stats():
+    for alias, entry in pool_stats().items():
+        pool = entry.get('pool', {})
+        current = {
+            DB_CONNECTS: entry['connects'],
+            DB_POOL_REQUESTS: pool.get('requests_num', 0),
+            DB_POOL_QUEUED: pool.get('requests_queued', 0),
+            DB_POOL_WAIT: pool.get('requests_wait_ms', 0) / 1000,
+            DB_POOL_TIMEOUTS: pool.get('requests_errors', 0),
+        }
+        seen = _db_seen.setdefault(alias, {})
+        for counter, value in current.items():
+            delta = value - seen.get(counter, 0)
+            if delta > 0:
+                counter.labels(alias).inc(delta)
+            seen[counter] = value
+        if pool:
+            DB_POOL_SIZE.labels(alias).set(pool.get('pool_size', 0))
+            DB_POOL_AVAILABLE.labels(alias).set(pool.get('pool_available', 0))
+            DB_POOL_WAITING.labels(alias).set(pool.get('requests_waiting', 0))
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, started)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        #имя представления, а не путь: иначе каждый id заказа стал бы отдельной серией
+        request.metrics_route = view_name(view_func, request)
+
+    def observe(self, request, response, started):
+        route = getattr(request, 'metrics_route', 'unmatched')
+        method = request.method if request.method in HTTP_METHODS else 'other'
+        REQUEST_LATENCY.labels(method, route).observe(time.perf_counter() - started)
+        REQUESTS.labels(method, route, str(response.status_code)).inc()
+        update_db_metrics()
+
+
+def metrics_allowed(request):
+    if settings.METRICS_PUBLIC:
+        return True
+    authorization = request.headers.get('Authorization', '')
+    if settings.METRICS_TOKEN and constant_time_compare(authorization, f'Bearer {settings.METRICS_TOKEN}'):
+        return True
+    try:
+        ip = ipaddress.ip_address(client_ip(request))
+    except ValueError:
+        return False
+    return any(ip in ipaddress.ip_network(network.strip()) for network in settings.METRICS_ALLOWED_NETWORKS if network.strip())
+
+
+def metrics_view(request):
+    if not metrics_allowed(request):
+        return HttpResponse(status=401)
+    update_db_metrics(force=True)
+    registry = REGISTRY
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
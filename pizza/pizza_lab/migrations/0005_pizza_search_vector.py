@@ -0,0 +1,62 @@
+# Generated by Django 5.2 on 2026-10-18 14:54
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+FORWARD_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE OR REPLACE FUNCTION pizza_lab_pizza_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('russian', coalesce(NEW.description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER pizza_lab_pizza_search_vector_trigger
+    BEFORE INSERT OR UPDATE ON pizza_lab_pizza
+    FOR EACH ROW EXECUTE FUNCTION pizza_lab_pizza_search_vector_update()
+    """,
+    "UPDATE pizza_lab_pizza SET name = name",
+    "CREATE INDEX pizza_lab_pizza_search_vector_gin ON pizza_lab_pizza USING gin (search_vector)",
+    "CREATE INDEX pizza_lab_pizza_name_trgm ON pizza_lab_pizza USING gin (name gin_trgm_ops)",
+    #icontains в django компилируется в UPPER(name::text) LIKE UPPER(...)
+    "CREATE INDEX pizza_lab_pizza_name_upper_trgm ON pizza_lab_pizza USING gin (UPPER(name::text) gin_trgm_ops)",
+]
+
+BACKWARD_SQL = [
+    "DROP INDEX IF EXISTS pizza_lab_pizza_name_upper_trgm",
+    "DROP INDEX IF EXISTS pizza_lab_pizza_name_trgm",
+    "DROP INDEX IF EXISTS pizza_lab_pizza_search_vector_gin",
+    "DROP TRIGGER IF EXISTS pizza_lab_pizza_search_vector_trigger ON pizza_lab_pizza",
+    "DROP FUNCTION IF EXISTS pizza_lab_pizza_search_vector_update()",
+]
+
+
+def run_postgres_sql(statements):
+    #триггер и gin-индексы есть только в postgres, sqlite остаётся с пустым полем
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pizza_lab', '0004_productinorder_end_quantity_productinorder_is_ready'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pizza',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(run_postgres_sql(FORWARD_SQL), run_postgres_sql(BACKWARD_SQL)),
+    ]
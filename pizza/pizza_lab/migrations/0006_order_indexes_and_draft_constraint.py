@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-18 14:56
+
+from django.db import migrations, models
+
+
+def delete_duplicate_drafts(apps, schema_editor):
+    #оставляем самый ранний черновик клиента, остальные помечаем удалёнными
+    Order_pizza = apps.get_model('pizza_lab', 'Order_pizza')
+    kept = set()
+    for order_id, client_id in Order_pizza.objects.filter(status='DRAFT').order_by('id').values_list('id', 'client_id'):
+        if client_id in kept:
+            Order_pizza.objects.filter(id=order_id).update(status='DELETED')
+        kept.add(client_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pizza_lab', '0005_pizza_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order_pizza',
+            index=models.Index(fields=['status', 'formation_datetime'], name='order_status_formation_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pizza',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['id'], name='pizza_not_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pizza',
+            index=models.Index(fields=['cook', 'id'], name='pizza_cook_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productinorder',
+            index=models.Index(fields=['product', 'order'], include=('quantity', 'end_quantity'), name='productinorder_product_idx'),
+        ),
+        migrations.RunPython(delete_duplicate_drafts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='order_pizza',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'DRAFT')), fields=('client',), name='unique_draft_order_per_client'),
+        ),
+    ]
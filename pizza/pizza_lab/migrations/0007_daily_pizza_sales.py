@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 14:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pizza_lab', '0006_order_indexes_and_draft_constraint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPizzaSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('orders', models.PositiveIntegerField(default=0, verbose_name='Завершённых заказов')),
+                ('quantity', models.PositiveIntegerField(default=0, verbose_name='Продано пицц')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Выручка')),
+                ('rejected_orders', models.PositiveIntegerField(default=0, verbose_name='Отклонённых заказов')),
+                ('rejected_quantity', models.PositiveIntegerField(default=0, verbose_name='Отклонено пицц')),
+                ('cook', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_sales', to=settings.AUTH_USER_MODEL)),
+                ('pizza', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='pizza_lab.pizza')),
+            ],
+            options={
+                'unique_together': {('day', 'pizza')},
+            },
+        ),
+    ]
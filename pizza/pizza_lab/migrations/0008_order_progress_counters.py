@@ -0,0 +1,60 @@
+# Generated by Django 5.2 on 2026-10-18 15:03
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def fill_order_totals(apps, schema_editor):
+    Order_pizza = apps.get_model('pizza_lab', 'Order_pizza')
+    ProductInOrder = apps.get_model('pizza_lab', 'ProductInOrder')
+    totals = (
+        ProductInOrder.objects.values('order_id')
+        .annotate(
+            items_total=Sum('quantity'),
+            items_cooked=Sum('end_quantity'),
+            total_price=Sum(F('quantity') * F('product__price')),
+        )
+        .order_by('order_id')
+    )
+    for row in totals.iterator(chunk_size=1000):
+        Order_pizza.objects.filter(id=row['order_id']).update(
+            items_total=row['items_total'],
+            items_cooked=row['items_cooked'],
+            total_price=row['total_price'],
+            is_ready=row['items_total'] > 0 and row['items_cooked'] >= row['items_total'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pizza_lab', '0007_daily_pizza_sales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order_pizza',
+            name='is_ready',
+            field=models.BooleanField(default=False, verbose_name='Все пиццы приготовлены?'),
+        ),
+        migrations.AddField(
+            model_name='order_pizza',
+            name='items_cooked',
+            field=models.PositiveIntegerField(default=0, verbose_name='Приготовлено пицц'),
+        ),
+        migrations.AddField(
+            model_name='order_pizza',
+            name='items_total',
+            field=models.PositiveIntegerField(default=0, verbose_name='Пицц в заказе'),
+        ),
+        migrations.AddField(
+            model_name='order_pizza',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Сумма заказа'),
+        ),
+        migrations.RunPython(fill_order_totals, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order_pizza',
+            index=models.Index(fields=['status', 'is_ready', 'formation_datetime'], name='order_status_ready_idx'),
+        ),
+    ]
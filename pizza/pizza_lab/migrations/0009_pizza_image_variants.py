@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pizza_lab', '0008_order_progress_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pizza',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pizza_lab', '0010_job'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='dailypizzasales',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='dailypizzasales',
+            constraint=models.UniqueConstraint(condition=models.Q(('cook__isnull', False)), fields=('day', 'pizza', 'cook'), name='daily_sales_day_pizza_cook_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailypizzasales',
+            constraint=models.UniqueConstraint(condition=models.Q(('cook__isnull', True)), fields=('day', 'pizza'), name='daily_sales_day_pizza_no_cook_uniq'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 15:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pizza_lab', '0011_daily_sales_per_cook'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productinorder',
+            name='price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Цена в заказе'),
+        ),
+    ]
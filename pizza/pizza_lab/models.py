@@ -1,10 +1,17 @@
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.conf import settings
-from storages.backends.s3boto3 import S3Boto3Storage
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser, PermissionsMixin
 
-minio_storage = S3Boto3Storage()
+from pizza_lab.clients import image_storage
+
+#хранилище STORAGES['images'] (MinIO); boto3 загружается при первой работе с картинкой
+minio_storage = image_storage
 
 class CustomUserManager(BaseUserManager):
     def create_user(self, username, password=None, **extra_fields):
@@ -34,6 +41,18 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
 
     def __str__(self):
         return self.username
+
+    def get_session_auth_hash(self):
+        #у пользователя из pizza_lab.user_cache пароль не загружен, хеш приходит из кеша
+        cached = getattr(self, 'cached_session_auth_hash', None)
+        return cached or super().get_session_auth_hash()
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def forget_cached_user(sender, instance, **kwargs):
+    from pizza_lab.user_cache import forget_user
+    forget_user(instance.pk)
+    #и ещё раз после коммита, чтобы параллельный запрос не закешировал старые роли
+    transaction.on_commit(lambda: forget_user(instance.pk))
     
 class Pizza(models.Model):
     name = models.CharField(max_length=255)
@@ -42,10 +61,22 @@ class Pizza(models.Model):
     cook = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='pizzas')
     deleted = models.BooleanField(default=False)
     image = models.ImageField(upload_to='pizza/', null=True, blank=True, storage=minio_storage)
+    #{формат: {ширина: имя файла}}, заполняется pizza_lab.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_vegetarian = models.BooleanField(null=True, blank=True)
+    #в postgres заполняется триггером из name и description, в sqlite всегда пустой
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         return self.name
+
+    class Meta:
+        indexes = [
+            #каталог всегда фильтруется по deleted=False
+            models.Index(fields=['id'], condition=models.Q(deleted=False), name='pizza_not_deleted_idx'),
+            #соединение позиций заказа с поваром пиццы
+            models.Index(fields=['cook', 'id'], name='pizza_cook_idx'),
+        ]
     
 class Order_pizza(models.Model):
     class OrderStatus(models.TextChoices):
@@ -66,16 +97,37 @@ class Order_pizza(models.Model):
     completion_datetime = models.DateTimeField(blank=True, null=True)
     client = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, related_name='created_orders')
     manager = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, related_name='managed_orders', blank=True, null=True)
+    #счётчики по позициям заказа, поддерживаются pizza_lab.progress
+    items_total = models.PositiveIntegerField(default=0, verbose_name="Пицц в заказе")
+    items_cooked = models.PositiveIntegerField(default=0, verbose_name="Приготовлено пицц")
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Сумма заказа")
+    is_ready = models.BooleanField(default=False, verbose_name="Все пиццы приготовлены?")
 
     def __str__(self):
         return f"Заказ № {self.id}"
 
+    class Meta:
+        constraints = [
+            #у клиента может быть только одна заявка-черновик
+            models.UniqueConstraint(
+                fields=['client'],
+                condition=models.Q(status='DRAFT'),
+                name='unique_draft_order_per_client',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'formation_datetime'], name='order_status_formation_idx'),
+            models.Index(fields=['status', 'is_ready', 'formation_datetime'], name='order_status_ready_idx'),
+        ]
+
 class ProductInOrder(models.Model):
     order = models.ForeignKey(Order_pizza, on_delete=models.CASCADE)
     product = models.ForeignKey(Pizza, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
     end_quantity = models.PositiveIntegerField(default=0, verbose_name="Приготовлено пицц")
     is_ready = models.BooleanField(default=False, verbose_name="Заказ выполнен?")
+    #цена пиццы на момент формирования заказа, у черновика пустая (pizza_lab.progress)
+    price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name="Цена в заказе")
 
     def save(self, *args, **kwargs):
         self.is_ready = self.end_quantity >= self.quantity
@@ -85,4 +137,71 @@ class ProductInOrder(models.Model):
         return f"{self.order_id}-{self.product_id}"
 
     class Meta:
-        unique_together = ('order', 'product'),
\ No newline at end of file
+        unique_together = ('order', 'product'),
+        indexes = [
+            #задачи повара: позиции по пицце без обращения к таблице
+            models.Index(
+                fields=['product', 'order'],
+                include=['quantity', 'end_quantity'],
+                name='productinorder_product_idx',
+            ),
+        ]
+
+class DailyPizzaSales(models.Model):
+    """Сводка продаж за день по пицце и её повару; пополняется при завершении и отклонении заказов"""
+    day = models.DateField()
+    pizza = models.ForeignKey(Pizza, on_delete=models.CASCADE, related_name='daily_sales')
+    cook = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='daily_sales')
+    orders = models.PositiveIntegerField(default=0, verbose_name="Завершённых заказов")
+    quantity = models.PositiveIntegerField(default=0, verbose_name="Продано пицц")
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Выручка")
+    rejected_orders = models.PositiveIntegerField(default=0, verbose_name="Отклонённых заказов")
+    rejected_quantity = models.PositiveIntegerField(default=0, verbose_name="Отклонено пицц")
+
+    def __str__(self):
+        return f"{self.day} {self.pizza_id}"
+
+    class Meta:
+        constraints = [
+            #у переназначенной пиццы продажи до и после смены повара - разные строки
+            models.UniqueConstraint(
+                fields=['day', 'pizza', 'cook'],
+                condition=models.Q(cook__isnull=False),
+                name='daily_sales_day_pizza_cook_uniq',
+            ),
+            #NULL в уникальном индексе не совпадает сам с собой, поэтому строки без повара - отдельным индексом
+            models.UniqueConstraint(
+                fields=['day', 'pizza'],
+                condition=models.Q(cook__isnull=True),
+                name='daily_sales_day_pizza_no_cook_uniq',
+            ),
+        ]
+
+class Job(models.Model):
+    """Фоновая задача; ставится через pizza_lab.jobs.enqueue, выполняется командой run_jobs"""
+    class JobStatus(models.TextChoices):
+        QUEUED = "QUEUED"
+        RUNNING = "RUNNING"
+        DONE = "DONE"
+        FAILED = "FAILED"
+
+    name = models.CharField(max_length=100, verbose_name="Задача")
+    kwargs = models.JSONField(default=dict, blank=True, verbose_name="Аргументы")
+    status = models.CharField(max_length=10, choices=JobStatus.choices, default=JobStatus.QUEUED)
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    max_attempts = models.PositiveIntegerField(default=5, verbose_name="Максимум попыток")
+    run_after = models.DateTimeField(default=timezone.now, verbose_name="Не раньше")
+    locked_at = models.DateTimeField(blank=True, null=True, verbose_name="Взята воркером")
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, default='')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, related_name='jobs', blank=True, null=True)
+    creation_datetime = models.DateTimeField(auto_now_add=True)
+    completion_datetime = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.name} #{self.id}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
@@ -0,0 +1,141 @@
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+from rest_framework.response import Response
+
+from pizza_lab.search import PizzaSearchFilter
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Курсорная пагинация по кортежу полей сортировки (например, дата + id).
+    Позиция в курсоре однозначна, поэтому смещение всегда нулевое и
+    стоимость страницы не зависит от глубины прокрутки.
+    Включается, только если клиент передал page_size или cursor,
+    чтобы старые клиенты продолжали получать полный список.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-id',)
+
+    def get_page_size(self, request):
+        params = request.query_params
+        if self.page_size_query_param not in params and self.cursor_query_param not in params:
+            return None
+        return super().get_page_size(request)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = tuple(super().get_ordering(request, queryset, view))
+        #id в конце делает позицию уникальной
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering += ('-id' if ordering[0].startswith('-') else 'id',)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (reverse, current_position) = (False, None)
+        else:
+            (_, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(current_position, reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_keyset_filter(self, position, reverse):
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        #(a, b) > (x, y)  =>  a >= x AND (a > x OR (a = x AND b > y))
+        fields = [(order.lstrip('-'), order.startswith('-') != reverse) for order in self.ordering]
+        condition = Q()
+        equal = Q()
+        for (field, descending), value in zip(fields, values):
+            condition |= equal & Q(**{field + ('__lt' if descending else '__gt'): value})
+            equal &= Q(**{field: value})
+        first_field, first_descending = fields[0]
+        bound = Q(**{first_field + ('__lte' if first_descending else '__gte'): values[0]})
+        return bound & condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            value = getattr(instance, order.lstrip('-'))
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else str(value))
+        return json.dumps(values)
+
+    def get_paginated_response(self, data):
+        #словарь (например, pizzas + draft_order_id) раскладываем на верхний уровень ответа
+        if isinstance(data, dict):
+            return Response(OrderedDict([
+                ('next', self.get_next_link()),
+                ('previous', self.get_previous_link()),
+                *data.items(),
+            ]))
+        return super().get_paginated_response(data)
+
+
+class PizzaPagination(KeysetPagination):
+    ordering = ('id',)
+
+    def get_page_size(self, request):
+        #результаты поиска отсортированы по релевантности (pizza_lab.search), курсор по id сбил бы этот порядок;
+        #выдача поиска ограничена меню, поэтому отдаётся целиком
+        if request.query_params.get(PizzaSearchFilter.search_param, '').strip():
+            return None
+        return super().get_page_size(request)
+
+
+class OrderPagination(KeysetPagination):
+    ordering = ('-creation_datetime', '-id')
@@ -0,0 +1,226 @@
+"""
+Где уходит время запроса: PerformanceMiddleware считает для каждого запроса представление, общее время,
+время и число запросов в бд, попадания и промахи кеша, время сериализации и рендера.
+Цифры уходят в заголовок Server-Timing и в лог pizza_lab.perf одной json-строкой.
+Медленные запросы в бд (PERF_SLOW_QUERY_MS) и повторяющиеся (N+1, PERF_DUPLICATE_QUERY_THRESHOLD)
+пишутся в лог с местом в коде, откуда они пришли.
+Данные запроса лежат в ContextVar, поэтому учитываются и запросы из sync_to_async-потоков под ASGI.
+"""
+import json
+import logging
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self, request):
+        self.method = request.method
+        self.path = request.path
+        self.view = None
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.queries = 0
+        self.sql_counts = Counter()
+        self.duplicates = {}  #sql -> место в коде, где повтор достиг порога
+        self.slow_queries = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.spans = Counter()
+
+    def add_query(self, sql, duration):
+        self.db_time += duration
+        self.queries += 1
+        self.sql_counts[sql] += 1
+        if self.sql_counts[sql] == settings.PERF_DUPLICATE_QUERY_THRESHOLD:
+            self.duplicates[sql] = query_origin()
+        if duration * 1000 >= settings.PERF_SLOW_QUERY_MS:
+            origin = query_origin()
+            self.slow_queries.append({'sql': sql, 'ms': round(duration * 1000, 1), 'origin': origin})
+            logger.warning('Slow query %.1f ms in %s at %s: %s', duration * 1000, self.view or self.path, origin, sql)
+
+
+@contextmanager
+def span(name):
+    """Добавляет время блока к метрике name текущего запроса (serialize, render, ...)"""
+    metrics = _current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.spans[name] += time.perf_counter() - started
+
+
+def record_cache(hits, misses):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+def query_origin():
+    """Ближайший к запросу кадр стека из кода проекта (не django и не библиотек)"""
+    base_dir = str(settings.BASE_DIR)
+    #walk_stack не читает исходники, в отличие от extract_stack
+    for frame, lineno in traceback.walk_stack(None):
+        filename = frame.f_code.co_filename
+        if filename.startswith(base_dir) and 'site-packages' not in filename and filename != __file__:
+            return f'{Path(filename).relative_to(base_dir)}:{lineno} in {frame.f_code.co_name}'
+    return 'unknown'
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, time.perf_counter() - started)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    #execute_wrappers живут в DatabaseWrapper потока и переживают переподключения, поэтому проверяем повтор
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def instrument_open_connections():
+    #соединения этого потока, открытые до импорта модуля (проверки при старте, shell)
+    for connection in connections.all(initialized_only=True):
+        instrument_connection(None, connection)
+
+
+def view_name(view_func, request):
+    """PizzaViewSet.list, CookTaskListView, pizza_list"""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__qualname__', repr(view_func))
+    actions = getattr(view_func, 'actions', None)
+    if actions and request.method.lower() in actions:
+        return f'{view_class.__name__}.{actions[request.method.lower()]}'
+    return view_class.__name__
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        instrument_open_connections()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics(request)
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(metrics, response)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics(request)
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(metrics, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view = view_name(view_func, request)
+
+    def finish(self, metrics, response):
+        total = time.perf_counter() - metrics.started
+        if settings.PERF_SERVER_TIMING:
+            response['Server-Timing'] = server_timing(metrics, total)
+
+        entry = {
+            'method': metrics.method,
+            'path': metrics.path,
+            'view': metrics.view,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'db_ms': round(metrics.db_time * 1000, 1),
+            'queries': metrics.queries,
+            'cache_hits': metrics.cache_hits,
+            'cache_misses': metrics.cache_misses,
+            **{f'{name}_ms': round(duration * 1000, 1) for name, duration in metrics.spans.items()},
+        }
+        if metrics.slow_queries:
+            entry['slow_queries'] = metrics.slow_queries
+        if metrics.duplicates:
+            entry['duplicate_queries'] = [
+                {'sql': sql, 'count': metrics.sql_counts[sql], 'origin': origin}
+                for sql, origin in metrics.duplicates.items()
+            ]
+            for duplicate in entry['duplicate_queries']:
+                logger.warning(
+                    'Possible N+1 in %s: %s x at %s: %s',
+                    metrics.view or metrics.path, duplicate['count'], duplicate['origin'], duplicate['sql'],
+                )
+        logger.info(json.dumps(entry, ensure_ascii=False))
+        return response
+
+
+def server_timing(metrics, total):
+    parts = [
+        f'total;dur={total * 1000:.1f}',
+        f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+        f'cache;desc="hit={metrics.cache_hits} miss={metrics.cache_misses}"',
+    ]
+    parts += [f'{name};dur={duration * 1000:.1f}' for name, duration in metrics.spans.items()]
+    return ', '.join(parts)
+
+
+class CacheMetricsMixin:
+    """Для бэкенда кеша: считает попадания и промахи get/get_many в текущем запросе (async-методы идут через них)"""
+    _missing = object()
+
+    def get(self, key, default=None, version=None, **kwargs):
+        value = super().get(key, self._missing, version=version, **kwargs)
+        if value is self._missing:
+            record_cache(0, 1)
+            return default
+        #None без исключения - значение, с IGNORE_EXCEPTIONS - ошибка redis; считаем промахом
+        record_cache(*((0, 1) if value is None else (1, 0)))
+        return value
+
+    def get_many(self, keys, version=None, **kwargs):
+        keys = list(keys)
+        values = super().get_many(keys, version=version, **kwargs)
+        record_cache(len(values), len(keys) - len(values))
+        return values
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer, время которого попадает в метрику render"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with span('render'):
+            return super().render(data, accepted_media_type, renderer_context)
@@ -0,0 +1,66 @@
+from django.db.models import BooleanField, Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from pizza_lab.models import Order_pizza, Pizza, ProductInOrder
+
+
+def ready_expression(items_cooked):
+    return Case(
+        When(items_total__gt=0, items_total__lte=items_cooked, then=Value(True)),
+        default=Value(False),
+        output_field=BooleanField(),
+    )
+
+
+def line_sum(expression, output_field):
+    lines = ProductInOrder.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    return Coalesce(
+        Subquery(lines.annotate(total=Sum(expression, output_field=output_field)).values('total')),
+        Value(0),
+        output_field=output_field,
+    )
+
+
+def line_ready_expression(quantity):
+    """is_ready позиции заказа, у которой количество становится quantity"""
+    return Case(
+        When(end_quantity__gte=quantity, then=Value(True)),
+        default=Value(False),
+        output_field=BooleanField(),
+    )
+
+
+def refresh_order_totals(order_ids, snapshot_prices=False):
+    """
+    Пересчитывает счётчики и сумму заказов по их позициям (после правки корзины, при формировании).
+    При формировании (snapshot_prices) цены пицц запоминаются в позициях, и сумма считается по ним;
+    иначе по текущим ценам пересчитываются только черновики - у сформированного заказа сумма зафиксирована.
+    """
+    price_field = DecimalField(max_digits=12, decimal_places=2)
+    if snapshot_prices:
+        ProductInOrder.objects.filter(order_id__in=order_ids).update(
+            price=Subquery(Pizza.objects.filter(id=OuterRef('product_id')).values('price')[:1]),
+        )
+        total_price = line_sum(F('quantity') * F('price'), output_field=price_field)
+    else:
+        total_price = Case(
+            When(status=Order_pizza.OrderStatus.DRAFT, then=line_sum(F('quantity') * F('product__price'), output_field=price_field)),
+            default=F('total_price'),
+        )
+    orders = Order_pizza.objects.filter(id__in=order_ids)
+    orders.update(
+        items_total=line_sum(F('quantity'), output_field=Order_pizza._meta.get_field('items_total')),
+        items_cooked=line_sum(F('end_quantity'), output_field=Order_pizza._meta.get_field('items_cooked')),
+        total_price=total_price,
+    )
+    orders.update(is_ready=ready_expression(F('items_cooked')))
+
+
+def add_cooked(order_id, count):
+    """Прибавляет приготовленные пиццы к заказу; возвращает True, если заказ теперь полностью готов"""
+    orders = Order_pizza.objects.filter(id=order_id)
+    orders.update(
+        items_cooked=F('items_cooked') + count,
+        is_ready=ready_expression(F('items_cooked') + count),
+    )
+    return orders.filter(is_ready=True).exists()
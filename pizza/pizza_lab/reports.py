@@ -0,0 +1,155 @@
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from pizza_lab.models import DailyPizzaSales, Order_pizza, ProductInOrder
+
+Status = Order_pizza.OrderStatus
+
+UPSERT_SQL = """
+    INSERT INTO {table} (day, pizza_id, cook_id, orders, quantity, revenue, rejected_orders, rejected_quantity)
+    VALUES {values}
+    ON CONFLICT {target} DO UPDATE SET
+        orders = {table}.orders + EXCLUDED.orders,
+        quantity = {table}.quantity + EXCLUDED.quantity,
+        revenue = {table}.revenue + EXCLUDED.revenue,
+        rejected_orders = {table}.rejected_orders + EXCLUDED.rejected_orders,
+        rejected_quantity = {table}.rejected_quantity + EXCLUDED.rejected_quantity
+"""
+
+#частичные уникальные индексы DailyPizzaSales: для строк с поваром и без него
+CONFLICT_TARGETS = {
+    True: '(day, pizza_id, cook_id) WHERE cook_id IS NOT NULL',
+    False: '(day, pizza_id) WHERE cook_id IS NULL',
+}
+
+REPORT_GROUPS = {
+    'day': ['day'],
+    'pizza': ['pizza_id', 'pizza__name'],
+    'cook': ['cook_id', 'cook__username'],
+    'day_pizza': ['day', 'pizza_id', 'pizza__name'],
+    'day_cook': ['day', 'cook_id', 'cook__username'],
+}
+
+
+def line_revenue():
+    #по цене на момент формирования: иначе смена цены меняла бы уже учтённую выручку при пересчёте
+    return ExpressionWrapper(
+        F('quantity') * Coalesce('price', 'product__price'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def record_order_sales(order_ids, target, day=None):
+    """
+    Добавляет позиции заказов, только что переведённых в COMPLETED/REJECTED, в дневную сводку.
+    Вызывается в той же транзакции, что и смена статуса.
+    """
+    if target not in (Status.COMPLETED, Status.REJECTED) or not order_ids:
+        return
+    day = day or timezone.localdate()
+
+    rows = list(
+        ProductInOrder.objects.filter(order_id__in=order_ids)
+        .values('product_id', 'product__cook_id')
+        .annotate(
+            line_orders=Count('order_id', distinct=True),
+            line_quantity=Sum('quantity'),
+            line_revenue=Sum(line_revenue()),
+        )
+        .order_by('product_id')
+    )
+    if not rows:
+        return
+
+    values_by_target = {}
+    for row in rows:
+        if target == Status.COMPLETED:
+            counters = [row['line_orders'], row['line_quantity'], row['line_revenue'], 0, 0]
+        else:
+            counters = [0, 0, 0, row['line_orders'], row['line_quantity']]
+        has_cook = row['product__cook_id'] is not None
+        values_by_target.setdefault(has_cook, []).append([day, row['product_id'], row['product__cook_id'], *counters])
+
+    with connection.cursor() as cursor:
+        for has_cook, values in values_by_target.items():
+            sql = UPSERT_SQL.format(
+                table=DailyPizzaSales._meta.db_table,
+                values=', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s)'] * len(values)),
+                target=CONFLICT_TARGETS[has_cook],
+            )
+            cursor.execute(sql, [param for value in values for param in value])
+
+
+def rebuild_sales(start=None, end=None):
+    """
+    Пересчитывает сводку по истории заказов за [start, end] (даты завершения включительно).
+    Выручка считается по ценам в позициях, как и при завершении заказа. Повара в истории позиций нет,
+    поэтому продажи переназначенной пиццы после пересчёта относятся к её текущему повару.
+    """
+    orders = Q(order__status__in=[Status.COMPLETED, Status.REJECTED], order__completion_datetime__isnull=False)
+    stats = DailyPizzaSales.objects.all()
+    if start:
+        orders &= Q(order__completion_datetime__date__gte=start)
+        stats = stats.filter(day__gte=start)
+    if end:
+        orders &= Q(order__completion_datetime__date__lte=end)
+        stats = stats.filter(day__lte=end)
+
+    completed = Q(order__status=Status.COMPLETED)
+    rejected = Q(order__status=Status.REJECTED)
+    rows = (
+        ProductInOrder.objects.filter(orders)
+        .annotate(day=TruncDate('order__completion_datetime'))
+        .values('day', 'product_id', 'product__cook_id')
+        .annotate(
+            line_orders=Count('order_id', distinct=True, filter=completed),
+            line_quantity=Sum('quantity', filter=completed, default=0),
+            line_revenue=Sum(line_revenue(), filter=completed, default=0),
+            line_rejected_orders=Count('order_id', distinct=True, filter=rejected),
+            line_rejected_quantity=Sum('quantity', filter=rejected, default=0),
+        )
+        .order_by('day', 'product_id')
+    )
+
+    with transaction.atomic():
+        stats.delete()
+        created = DailyPizzaSales.objects.bulk_create(
+            (
+                DailyPizzaSales(
+                    day=row['day'],
+                    pizza_id=row['product_id'],
+                    cook_id=row['product__cook_id'],
+                    orders=row['line_orders'],
+                    quantity=row['line_quantity'],
+                    revenue=row['line_revenue'],
+                    rejected_orders=row['line_rejected_orders'],
+                    rejected_quantity=row['line_rejected_quantity'],
+                )
+                for row in rows.iterator(chunk_size=1000)
+            ),
+            batch_size=1000,
+        )
+    return len(created)
+
+
+def sales_report(start=None, end=None, group_by='day_pizza'):
+    stats = DailyPizzaSales.objects.all()
+    if start:
+        stats = stats.filter(day__gte=start)
+    if end:
+        stats = stats.filter(day__lte=end)
+
+    fields = REPORT_GROUPS[group_by]
+    return list(
+        stats.values(*fields)
+        .annotate(
+            total_orders=Sum('orders'),
+            total_quantity=Sum('quantity'),
+            total_revenue=Sum('revenue'),
+            total_rejected_orders=Sum('rejected_orders'),
+            total_rejected_quantity=Sum('rejected_quantity'),
+        )
+        .order_by(*fields)
+    )
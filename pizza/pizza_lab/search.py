@@ -0,0 +1,40 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from rest_framework import filters
+
+#должна совпадать с конфигурацией в триггере из миграции 0005
+SEARCH_CONFIG = 'russian'
+
+
+def search_pizzas(queryset, text):
+    """Поиск по названию и описанию, результаты отсортированы по релевантности"""
+    text = text.strip()
+    if not text:
+        return queryset
+
+    if connection.vendor == 'postgresql':
+        #все три условия обслуживаются gin-индексами: tsvector и pg_trgm
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+        return queryset.annotate(
+            rank=SearchRank(F('search_vector'), query),
+            similarity=TrigramSimilarity('name', text),
+        ).filter(
+            Q(search_vector=query) | Q(name__icontains=text) | Q(name__trigram_similar=text)
+        ).order_by('-rank', '-similarity', 'id')
+
+    #sqlite для локальной разработки: подстрока, совпадения в названии выше
+    return queryset.annotate(
+        rank=Case(
+            When(name__icontains=text, then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField(),
+        ),
+    ).filter(
+        Q(name__icontains=text) | Q(description__icontains=text)
+    ).order_by('-rank', 'id')
+
+
+class PizzaSearchFilter(filters.SearchFilter):
+    def filter_queryset(self, request, queryset, view):
+        return search_pizzas(queryset, request.query_params.get(self.search_param, ''))
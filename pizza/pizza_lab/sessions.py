@@ -0,0 +1,116 @@
+"""
+Сессии в redis (алиас кеша SESSION_CACHE_ALIAS) с откатом на таблицу django_session, пока redis недоступен.
+Сессии, записанные в бд во время сбоя, переезжают обратно в redis при первом чтении.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.backends import cache, db
+from django.contrib.sessions.backends.base import UpdateError
+from redis.exceptions import RedisError
+
+#django_redis без IGNORE_EXCEPTIONS пробрасывает ошибки redis-py, таймаут сокета - OSError
+REDIS_ERRORS = (RedisError, OSError)
+
+#после сбоя процесс какое-то время не ходит в redis, чтобы не ждать таймаут в каждом запросе
+_redis_down_until = 0.0
+
+
+def redis_available():
+    return time.monotonic() >= _redis_down_until
+
+
+def mark_redis_down():
+    global _redis_down_until
+    _redis_down_until = time.monotonic() + settings.SESSION_REDIS_RETRY_SECONDS
+
+
+class SessionStore(cache.SessionStore):
+    def load(self):
+        if not redis_available():
+            return self.load_from_db()
+        try:
+            session_data = self._cache.get(self.cache_key)
+        except REDIS_ERRORS:
+            mark_redis_down()
+            return self.load_from_db()
+        if session_data is not None:
+            return session_data
+        return self.load_from_db(move_to_redis=True)
+
+    def load_from_db(self, move_to_redis=False):
+        store = db.SessionStore(self.session_key)
+        session_data = store.load()
+        if store.session_key is None:
+            self._session_key = None
+            return {}
+        if move_to_redis:
+            expiry_age = self.get_expiry_age(expiry=session_data.get('_session_expiry'))
+            try:
+                self._cache.set(self.cache_key, session_data, expiry_age)
+            except REDIS_ERRORS:
+                mark_redis_down()
+            else:
+                store.delete()
+        return session_data
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        if redis_available():
+            try:
+                return super().save(must_create)
+            except REDIS_ERRORS:
+                mark_redis_down()
+        store = db.SessionStore(self.session_key)
+        store._session_cache = self._get_session(no_load=must_create)
+        try:
+            store.save(must_create=must_create)
+        except UpdateError:
+            #сессия до сбоя жила только в redis
+            store.save(must_create=True)
+
+    def exists(self, session_key):
+        if redis_available():
+            try:
+                return super().exists(session_key)
+            except REDIS_ERRORS:
+                mark_redis_down()
+        return db.SessionStore().exists(session_key)
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        if redis_available():
+            try:
+                super().delete(session_key)
+            except REDIS_ERRORS:
+                mark_redis_down()
+        db.SessionStore().delete(session_key)
+
+    @classmethod
+    def clear_expired(cls):
+        #в redis сессии истекают сами, чистим только то, что осталось в бд после сбоев
+        db.SessionStore.clear_expired()
+
+    async def aload(self):
+        return await sync_to_async(self.load)()
+
+    async def asave(self, must_create=False):
+        return await sync_to_async(self.save)(must_create)
+
+    async def acreate(self):
+        return await sync_to_async(self.create)()
+
+    async def aexists(self, session_key):
+        return await sync_to_async(self.exists)(session_key)
+
+    async def adelete(self, session_key=None):
+        return await sync_to_async(self.delete)(session_key)
+
+    @classmethod
+    async def aclear_expired(cls):
+        await sync_to_async(cls.clear_expired)()
@@ -0,0 +1,748 @@
+import csv
+import io
+import json
+import tempfile
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image, ImageCms
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from pizza import urls
+from pizza_lab import sessions
+from pizza_lab.clients import image_storage
+from pizza_lab.export import EXPORT_COLUMNS
+from pizza_lab.hashers import LIMIT_KEY_PREFIX, release_slots, take_slots
+from pizza_lab.images import process_pizza_image, variant_formats
+from pizza_lab.jobs import claim_job, enqueue, job, run_job
+from pizza_lab.models import CustomUser, DailyPizzaSales, Job, Order_pizza, Pizza, ProductInOrder
+from pizza_lab.progress import refresh_order_totals
+from pizza_lab.reports import rebuild_sales
+from pizza_lab.tokens import token_for_user
+from pizza_lab.transitions import transition_order
+
+#заказов и пицц в каждом заказе: число запросов не должно от них зависеть
+ORDERS = 6
+PRODUCTS = 4
+
+#кеши в памяти процесса вместо redis: лимиты входа, сессии и отзыв токенов работают без внешних сервисов
+LOCAL_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': alias}
+    for alias in ('default', 'sessions', 'tokens')
+}
+
+
+class OrderQueryCountTests(TestCase):
+    """Бюджеты запросов в бд для списков заказов и ответов со сменой статуса (N+1 по позициям и поварам)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = CustomUser.objects.create_user('manager', 'password', is_staff=True)
+        cls.client_user = CustomUser.objects.create_user('client', 'password')
+        cooks = [CustomUser.objects.create_user(f'cook{i}', 'password', is_cook=True) for i in range(PRODUCTS)]
+        pizzas = [
+            Pizza.objects.create(name=f'Пицца {i}', price=100 + i, description='', cook=cook)
+            for i, cook in enumerate(cooks)
+        ]
+        cls.orders = []
+        for i in range(ORDERS):
+            #последний заказ - черновик клиента, остальные сформированы
+            order = Order_pizza.objects.create(
+                client=cls.client_user,
+                status=Order_pizza.OrderStatus.DRAFT if i == ORDERS - 1 else Order_pizza.OrderStatus.FORMED,
+            )
+            ProductInOrder.objects.bulk_create(
+                ProductInOrder(order=order, product=pizza, quantity=2) for pizza in pizzas
+            )
+            cls.orders.append(order)
+
+    def api(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def assert_products(self, order_data):
+        self.assertEqual(len(order_data['products']), PRODUCTS)
+
+    def test_order_list(self):
+        client = self.api(self.manager)
+        #заказы и позиции всех заказов с пиццами и поварами
+        with self.assertNumQueries(2):
+            response = client.get('/api/orders/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), ORDERS)
+        for order_data in response.data:
+            self.assert_products(order_data)
+
+    def test_user_orders(self):
+        client = self.api(self.client_user)
+        with self.assertNumQueries(2):
+            response = client.get('/api/orders/user_orders/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), ORDERS)
+        for order_data in response.data:
+            self.assert_products(order_data)
+
+    def test_form(self):
+        client = self.api(self.client_user)
+        order = self.orders[-1]
+        with self.assertNumQueries(8):
+            response = client.put(f'/api/orders/{order.id}/form/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], Order_pizza.OrderStatus.FORMED)
+        self.assert_products(response.data)
+
+    def test_complete(self):
+        client = self.api(self.manager)
+        with self.assertNumQueries(7):
+            response = client.put(f'/api/orders/{self.orders[0].id}/complete/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], Order_pizza.OrderStatus.COMPLETED)
+        self.assert_products(response.data)
+
+    def test_reject(self):
+        client = self.api(self.manager)
+        with self.assertNumQueries(7):
+            response = client.put(f'/api/orders/{self.orders[0].id}/reject/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], Order_pizza.OrderStatus.REJECTED)
+        self.assert_products(response.data)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class LoginThrottleTests(TransactionTestCase):
+    """
+    Выдача JWT и вход через сессию проверяют пароль под одним ограничением одновременных входов.
+    TransactionTestCase: пароль проверяется в потоке пула хеширования со своим соединением с бд.
+    """
+
+    def setUp(self):
+        cache.clear()
+        CustomUser.objects.create_user('client', 'password')
+
+    def post(self, path, password='password'):
+        return self.client.post(path, {'username': 'client', 'password': password}, content_type='application/json')
+
+    def hold_slots(self):
+        #входы, которые ещё идут: следующий на этот логин превышает LOGIN_MAX_CONCURRENT_PER_USERNAME
+        limits = [(f'{LIMIT_KEY_PREFIX}:user:client', settings.LOGIN_MAX_CONCURRENT_PER_USERNAME)]
+        taken = []
+        for _ in range(settings.LOGIN_MAX_CONCURRENT_PER_USERNAME):
+            taken += take_slots(limits)[0]
+        return taken
+
+    def assert_throttled(self, path):
+        taken = self.hold_slots()
+        response = self.post(path)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+
+        release_slots(taken)
+        response = self.post(path)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_get_token(self):
+        response = self.assert_throttled('/api/get-token/')
+        self.assertEqual(set(response.json()), {'refresh', 'access'})
+        self.assertEqual(self.post('/api/get-token/', password='wrong').status_code, 401)
+
+    def test_login(self):
+        response = self.assert_throttled('/login')
+        self.assertEqual(response.json()['username'], 'client')
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class CookEventsTests(TestCase):
+    """SSE задач повара: только под ASGI, повар - по Bearer-токену или сессии"""
+    url = '/api/cook/tasks/events/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cook = CustomUser.objects.create_user('cook', 'password', is_cook=True)
+        cls.client_user = CustomUser.objects.create_user('client', 'password')
+
+    def bearer(self, user):
+        return {'Authorization': f'Bearer {token_for_user(user).access_token}'}
+
+    def test_wsgi_is_refused(self):
+        response = self.client.get(self.url, headers=self.bearer(self.cook))
+        self.assertEqual(response.status_code, 501)
+
+    async def test_bearer_token(self):
+        response = await self.async_client.get(self.url, headers=self.bearer(self.cook))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        #поток бесконечный: читаем только первое сообщение
+        self.assertEqual(await anext(aiter(response.streaming_content)), b'retry: 3000\n\n')
+        await response.streaming_content.aclose()
+
+    async def test_not_a_cook(self):
+        response = await self.async_client.get(self.url, headers=self.bearer(self.client_user))
+        self.assertEqual(response.status_code, 403)
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class OrderExportTests(TestCase):
+    """Потоковая выгрузка заказов: csv и ndjson, синхронный итератор под WSGI и async под ASGI"""
+    url = '/api/orders/export/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = CustomUser.objects.create_user('manager', 'password', is_staff=True)
+        client_user = CustomUser.objects.create_user('client', 'password')
+        pizzas = [Pizza.objects.create(name=f'Пицца {i}', price=100 + i, description='') for i in range(2)]
+        for _ in range(2):
+            order = Order_pizza.objects.create(client=client_user, status=Order_pizza.OrderStatus.FORMED)
+            ProductInOrder.objects.bulk_create(ProductInOrder(order=order, product=pizza, quantity=3) for pizza in pizzas)
+
+    def headers(self):
+        return {'Authorization': f'Bearer {token_for_user(self.manager).access_token}'}
+
+    def assert_csv(self, response, body):
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="orders.csv"')
+        rows = list(csv.reader(io.StringIO(body.decode())))
+        self.assertEqual(rows[0], [column for column, _ in EXPORT_COLUMNS])
+        self.assertEqual(len(rows), 1 + 4)
+        self.assertEqual(rows[1][rows[0].index('product_name')], 'Пицца 0')
+        self.assertEqual(rows[1][rows[0].index('client')], 'client')
+
+    def assert_ndjson(self, response, body):
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="orders.ndjson"')
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(list(rows[0]), [column for column, _ in EXPORT_COLUMNS])
+        self.assertEqual({row['quantity'] for row in rows}, {3})
+
+    def test_wsgi(self):
+        for export_format, check in (('csv', self.assert_csv), ('ndjson', self.assert_ndjson)):
+            response = self.client.get(self.url, {'export_format': export_format}, headers=self.headers())
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.is_async)
+            check(response, b''.join(response.streaming_content))
+
+    async def test_asgi(self):
+        headers = await sync_to_async(self.headers)()
+        for export_format, check in (('csv', self.assert_csv), ('ndjson', self.assert_ndjson)):
+            response = await self.async_client.get(self.url, {'export_format': export_format}, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_async)
+            check(response, b''.join([chunk async for chunk in response.streaming_content]))
+
+    def test_unknown_format(self):
+        response = self.client.get(self.url, {'export_format': 'xml'}, headers=self.headers())
+        self.assertEqual(response.status_code, 400)
+
+
+class OrderTotalsTests(TestCase):
+    """Счётчики и сумма заказа меняются вместе с позициями; сумма сформированного заказа не пересчитывается"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = CustomUser.objects.create_user('client', 'password')
+        cls.pizza = Pizza.objects.create(name='Маргарита', price=100, description='')
+
+    def create_order(self, status, quantity=2, end_quantity=0):
+        order = Order_pizza.objects.create(client=self.client_user, status=status)
+        line = ProductInOrder.objects.create(order=order, product=self.pizza, quantity=quantity, end_quantity=end_quantity)
+        refresh_order_totals([order.id], snapshot_prices=True)
+        return order, line
+
+    def api(self):
+        client = APIClient()
+        client.force_authenticate(self.client_user)
+        return client
+
+    def test_remove_pizza(self):
+        order, line = self.create_order(Order_pizza.OrderStatus.DRAFT, quantity=2, end_quantity=1)
+        response = self.api().delete(f'/api/orders/{order.id}/remove_pizza/', {'product_id': self.pizza.id}, format='json')
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        line.refresh_from_db()
+        self.assertEqual((line.quantity, line.is_ready), (1, True))
+        self.assertEqual((order.items_total, order.total_price, order.is_ready), (1, 100, True))
+
+        response = self.api().delete(f'/api/orders/{order.id}/remove_pizza/', {'product_id': self.pizza.id}, format='json')
+        self.assertEqual(response.data['message'], 'Order deleted as it was empty.')
+        self.assertFalse(Order_pizza.objects.filter(id=order.id).exists())
+
+    def test_price_change(self):
+        draft, draft_line = self.create_order(Order_pizza.OrderStatus.DRAFT)
+        formed, formed_line = self.create_order(Order_pizza.OrderStatus.FORMED)
+        Pizza.objects.filter(id=self.pizza.id).update(price=150)
+
+        for order, line in ((draft, draft_line), (formed, formed_line)):
+            response = self.api().put(f'/api/product_in_order/{line.id}/', {'quantity': 3}, format='json')
+            self.assertEqual(response.status_code, 200)
+            order.refresh_from_db()
+            self.assertEqual(order.items_total, 3)
+        #черновик - по новой цене, сформированный заказ хранит сумму на момент формирования
+        self.assertEqual(Order_pizza.objects.get(id=draft.id).total_price, 450)
+        self.assertEqual(Order_pizza.objects.get(id=formed.id).total_price, 200)
+
+
+class SalesRebuildTests(TestCase):
+    """Пересчёт сводки продаж по истории даёт ту же выручку, что и учёт при завершении заказа"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = CustomUser.objects.create_user('client', 'password')
+        cls.manager = CustomUser.objects.create_user('manager', 'password', is_staff=True)
+        cls.pizza = Pizza.objects.create(name='Маргарита', price=100, description='')
+
+    def api(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def sales(self):
+        return list(DailyPizzaSales.objects.values_list('pizza_id', 'quantity', 'revenue'))
+
+    def test_price_change(self):
+        order = Order_pizza.objects.create(client=self.client_user)
+        ProductInOrder.objects.create(order=order, product=self.pizza, quantity=2)
+        self.assertEqual(self.api(self.client_user).put(f'/api/orders/{order.id}/form/').status_code, 200)
+        Pizza.objects.filter(id=self.pizza.id).update(price=150)
+        self.assertEqual(self.api(self.manager).put(f'/api/orders/{order.id}/complete/').status_code, 200)
+
+        recorded = self.sales()
+        self.assertEqual(recorded, [(self.pizza.id, 2, 200)])
+        self.assertEqual(ProductInOrder.objects.get(order=order).price, 100)
+        Pizza.objects.filter(id=self.pizza.id).update(price=200)
+        rebuild_sales()
+        self.assertEqual(self.sales(), recorded)
+
+
+class CartTests(TestCase):
+    """Изменения корзины: проверка ввода и готовность позиций после уменьшения количества"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = CustomUser.objects.create_user('client', 'password')
+        cls.pizza = Pizza.objects.create(name='Маргарита', price=100, description='')
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+
+    def test_decrement_updates_ready(self):
+        order = Order_pizza.objects.create(client=self.client_user)
+        line = ProductInOrder.objects.create(order=order, product=self.pizza, quantity=3, end_quantity=1)
+        response = self.api.post('/api/orders/cart/', {'items': [{'product_id': self.pizza.id, 'delta': -2}]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        line.refresh_from_db()
+        order.refresh_from_db()
+        self.assertEqual((line.quantity, line.is_ready), (1, True))
+        self.assertEqual((order.items_total, order.is_ready), (1, True))
+
+    def test_invalid_quantity(self):
+        for quantity in ('abc', '1.5', 10 ** 12):
+            response = self.api.post('/api/orders/add_to_draft/', {'product_id': self.pizza.id, 'quantity': quantity}, format='json')
+            self.assertEqual(response.status_code, 400)
+        response = self.api.post('/api/orders/cart/', {'items': [{'product_id': self.pizza.id, 'delta': 2 ** 31}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order_pizza.objects.filter(client=self.client_user).exists())
+
+    def test_add_to_draft(self):
+        response = self.api.post('/api/orders/add_to_draft/', {'product_id': self.pizza.id, 'quantity': '2'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ProductInOrder.objects.get(order_id=response.data['order_id']).quantity, 2)
+
+
+class PizzaSearchPaginationTests(TestCase):
+    """Поиск сохраняет порядок по релевантности и при запросе страницы"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('client', 'password')
+        cls.in_description = Pizza.objects.create(name='Четыре сыра', price=100, description='Грибы и сыр')
+        cls.in_name = Pizza.objects.create(name='Грибная', price=100, description='')
+        Pizza.objects.create(name='Маргарита', price=100, description='')
+
+    @override_settings(CACHES=LOCAL_CACHES)
+    def test_search_with_page_size(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/pizzas/', {'search': 'Гриб', 'page_size': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([pizza['id'] for pizza in response.data['pizzas']], [self.in_name.id, self.in_description.id])
+
+
+@override_settings(CACHES=LOCAL_CACHES, JOBS_EAGER=True)
+class PizzaImageTests(TestCase):
+    """Производные копии картинки: размеры, форматы, прозрачность, метаданные и удаление при очистке"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        images = {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': media.name}}
+        storages = override_settings(STORAGES={**settings.STORAGES, 'images': images})
+        storages.enable()
+        self.addCleanup(storages.disable)
+        #хранилище создаётся один раз на процесс, под тестовые настройки - заново
+        image_storage._reset()
+        self.addCleanup(image_storage._reset)
+        self.manager = CustomUser.objects.create_user('manager', 'password', is_staff=True)
+
+    def create_pizza(self, image, **save_options):
+        buffer = io.BytesIO()
+        image.save(buffer, 'PNG', **save_options)
+        pizza = Pizza.objects.create(name='Маргарита', price=100, description='')
+        pizza.image.save('pizza.png', ContentFile(buffer.getvalue()))
+        process_pizza_image(pizza)
+        return pizza
+
+    def open_variants(self, pizza):
+        for image_format, names in pizza.image_variants.items():
+            for width, name in names.items():
+                with image_storage.open(name, 'rb') as variant:
+                    image = Image.open(variant)
+                    image.load()
+                yield image_format, int(width), image
+
+    def test_rgba_variants(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        icc = ImageCms.ImageCmsProfile(ImageCms.createProfile('sRGB')).tobytes()
+        pizza = self.create_pizza(Image.new('RGBA', (800, 600), (255, 0, 0, 255)), icc_profile=icc, exif=exif)
+
+        self.assertEqual(sorted(pizza.image_variants), sorted(variant_formats()))
+        variants = list(self.open_variants(pizza))
+        self.assertEqual(len(variants), 2 * len(variant_formats()))
+        for image_format, width, image in variants:
+            self.assertEqual(image.format.lower(), image_format)
+            self.assertEqual(image.size, (width, width * 3 // 4))
+            self.assertIn(width, (320, 640))
+            self.assertNotIn('icc_profile', image.info)
+            self.assertFalse(image.getexif())
+
+    def test_palette_transparency(self):
+        image = Image.new('P', (400, 300), 0)
+        image.putpalette([0, 0, 0, 255, 0, 0])
+        image.paste(1, (200, 0, 400, 300))
+        image.info['transparency'] = 0
+        pizza = self.create_pizza(image)
+
+        for image_format, width, variant in self.open_variants(pizza):
+            self.assertEqual(width, 320)
+            left = variant.convert('RGBA').getpixel((10, 10))
+            if image_format == 'jpeg':
+                #прозрачная половина - на белом фоне, а не цветом палитры под ней
+                self.assertTrue(all(channel > 240 for channel in left[:3]))
+            else:
+                self.assertEqual(left[3], 0)
+
+    def test_clear_image(self):
+        pizza = self.create_pizza(Image.new('RGB', (400, 300)))
+        names = [name for by_width in pizza.image_variants.values() for name in by_width.values()]
+        client = APIClient()
+        client.force_authenticate(self.manager)
+        response = client.put(f'/api/pizzas/{pizza.id}/', {'image': None}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.data['image_job'])
+        self.assertEqual(Pizza.objects.get(id=pizza.id).image_variants, {})
+        self.assertFalse(any(image_storage.exists(name) for name in names))
+
+
+class OrderTransitionRaceTests(TestCase):
+    """Смена статуса условным UPDATE: из двух одновременных переходов срабатывает только один"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = CustomUser.objects.create_user('client', 'password')
+        cls.manager = CustomUser.objects.create_user('manager', 'password', is_staff=True)
+        cls.pizza = Pizza.objects.create(name='Маргарита', price=100, description='')
+
+    def create_order(self, status):
+        order = Order_pizza.objects.create(client=self.client_user, status=status)
+        ProductInOrder.objects.create(order=order, product=self.pizza, quantity=2)
+        return order
+
+    def api(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_stale_instances(self):
+        #оба менеджера прочитали заказ сформированным, второй UPDATE уже не находит его в этом статусе
+        order = self.create_order(Order_pizza.OrderStatus.FORMED)
+        first, second = Order_pizza.objects.get(id=order.id), Order_pizza.objects.get(id=order.id)
+        self.assertTrue(transition_order(first, Order_pizza.OrderStatus.COMPLETED, manager=self.manager))
+        self.assertFalse(transition_order(second, Order_pizza.OrderStatus.REJECTED, manager=self.manager))
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order_pizza.OrderStatus.COMPLETED)
+        self.assertEqual(list(DailyPizzaSales.objects.values_list('quantity', 'rejected_quantity')), [(2, 0)])
+
+    def test_double_request(self):
+        order = self.create_order(Order_pizza.OrderStatus.DRAFT)
+        client = self.api(self.client_user)
+        self.assertEqual(client.put(f'/api/orders/{order.id}/form/').status_code, 200)
+        self.assertEqual(client.put(f'/api/orders/{order.id}/form/').status_code, 400)
+
+        manager = self.api(self.manager)
+        self.assertEqual(manager.put(f'/api/orders/{order.id}/complete/').status_code, 200)
+        self.assertEqual(manager.put(f'/api/orders/{order.id}/complete/').status_code, 400)
+        self.assertEqual(DailyPizzaSales.objects.get().orders, 1)
+
+    def test_bulk_conflicts(self):
+        formed = self.create_order(Order_pizza.OrderStatus.FORMED)
+        completed = self.create_order(Order_pizza.OrderStatus.COMPLETED)
+        response = self.api(self.manager).post(
+            '/api/orders/bulk_transition/',
+            {'status': Order_pizza.OrderStatus.REJECTED, 'ids': [formed.id, completed.id]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'updated': [formed.id], 'conflicts': [completed.id]})
+        self.assertEqual(Order_pizza.objects.get(id=completed.id).status, Order_pizza.OrderStatus.COMPLETED)
+
+
+@override_settings(ORDER_AUTO_COMPLETE=True)
+class CookedBatchTests(TestCase):
+    """Отметка противня: не больше заказанного, последняя пицца завершает заказ"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = CustomUser.objects.create_user('client', 'password')
+        cls.cook = CustomUser.objects.create_user('cook', 'password', is_cook=True)
+        cls.margherita = Pizza.objects.create(name='Маргарита', price=100, description='', cook=cls.cook)
+        cls.pepperoni = Pizza.objects.create(name='Пепперони', price=150, description='', cook=cls.cook)
+
+    def setUp(self):
+        self.order = Order_pizza.objects.create(client=self.client_user, status=Order_pizza.OrderStatus.FORMED)
+        ProductInOrder.objects.create(order=self.order, product=self.margherita, quantity=2)
+        ProductInOrder.objects.create(order=self.order, product=self.pepperoni, quantity=1)
+        refresh_order_totals([self.order.id], snapshot_prices=True)
+        self.api = APIClient()
+        self.api.force_authenticate(self.cook)
+
+    def cook_batch(self, *counts):
+        items = [{'order_id': self.order.id, 'product_id': pizza.id, 'count': count} for pizza, count in counts]
+        response = self.api.post('/api/product_in_order/increment-cooked-batch/', {'items': items}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [(result['result'], result['remaining_to_cook']) for result in response.data['results']]
+
+    def test_overshoot_and_auto_complete(self):
+        results = self.cook_batch((self.margherita, 2), (self.pepperoni, 3))
+        self.assertEqual(results, [('incremented', 0), ('already_cooked', 1)])
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.items_cooked, self.order.status), (2, Order_pizza.OrderStatus.FORMED))
+        self.assertEqual(ProductInOrder.objects.get(order=self.order, product=self.pepperoni).end_quantity, 0)
+
+        self.assertEqual(self.cook_batch((self.pepperoni, 1)), [('incremented', 0)])
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.is_ready)
+        self.assertEqual(self.order.status, Order_pizza.OrderStatus.COMPLETED)
+        self.assertEqual(self.cook_batch((self.margherita, 1)), [('already_cooked', 0)])
+
+
+#вызовы тестовой задачи: первые failures из них падают
+FLAKY_CALLS = []
+
+
+@job('tests.flaky')
+def flaky_job(failures):
+    FLAKY_CALLS.append(failures)
+    if len(FLAKY_CALLS) <= failures:
+        raise RuntimeError('flaky')
+    return {'calls': len(FLAKY_CALLS)}
+
+
+@override_settings(JOBS_MAX_ATTEMPTS=3)
+class JobQueueTests(TestCase):
+    """Очередь задач: выполнение при JOBS_EAGER, повтор с задержкой и FAILED после последней попытки"""
+
+    def setUp(self):
+        FLAKY_CALLS.clear()
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_retry(self):
+        with self.assertLogs('pizza_lab.jobs', 'WARNING'):
+            queued = enqueue('tests.flaky', failures=2)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts, queued.result), (Job.JobStatus.DONE, 3, {'calls': 3}))
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_failed(self):
+        with self.assertLogs('pizza_lab.jobs', 'ERROR'):
+            queued = enqueue('tests.flaky', failures=5)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.JobStatus.FAILED, 3))
+        self.assertIn('RuntimeError', queued.error)
+        self.assertEqual(len(FLAKY_CALLS), 3)
+
+    @override_settings(JOBS_EAGER=False, JOBS_RETRY_BASE_SECONDS=5)
+    def test_worker_backoff(self):
+        queued = enqueue('tests.flaky', failures=1)
+        self.assertEqual(Job.objects.get(id=queued.id).status, Job.JobStatus.QUEUED)
+
+        claimed = claim_job()
+        self.assertEqual(claimed.id, queued.id)
+        with self.assertLogs('pizza_lab.jobs', 'WARNING'):
+            self.assertFalse(run_job(claimed))
+        claimed.refresh_from_db()
+        self.assertEqual((claimed.status, claimed.attempts), (Job.JobStatus.QUEUED, 1))
+        self.assertGreaterEqual(claimed.run_after, timezone.now())
+        #до истечения задержки воркер задачу не берёт
+        self.assertIsNone(claim_job())
+
+        Job.objects.filter(id=queued.id).update(run_after=timezone.now())
+        claimed = claim_job()
+        self.assertTrue(run_job(claimed))
+        claimed.refresh_from_db()
+        self.assertEqual((claimed.status, claimed.attempts), (Job.JobStatus.DONE, 2))
+
+
+#redis, к которому нельзя подключиться: ошибки соединения как при настоящем сбое
+UNREACHABLE_REDIS = {
+    'BACKEND': 'pizza_lab.cache_backends.RedisCache',
+    'LOCATION': 'redis://127.0.0.1:1/0',
+    'OPTIONS': {'SOCKET_CONNECT_TIMEOUT': 0.5, 'SOCKET_TIMEOUT': 0.5},
+}
+UNREACHABLE_SESSIONS = {**LOCAL_CACHES, 'sessions': UNREACHABLE_REDIS}
+
+
+class SessionFallbackTests(TestCase):
+    """Сессии пишутся в бд, пока redis недоступен, и возвращаются в redis после восстановления"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('client', 'password')
+
+    def setUp(self):
+        self.addCleanup(setattr, sessions, '_redis_down_until', 0.0)
+
+    def assert_logged_in(self):
+        self.assertEqual(self.client.get('/api/orders/user_orders/').status_code, 200)
+
+    def test_redis_down(self):
+        with override_settings(CACHES=UNREACHABLE_SESSIONS):
+            self.client.force_login(self.user)
+            self.assertFalse(sessions.redis_available())
+            session_key = self.client.session.session_key
+            self.assertTrue(Session.objects.filter(session_key=session_key).exists())
+            self.assert_logged_in()
+
+        #redis снова доступен: при чтении сессия переезжает из бд в redis
+        sessions._redis_down_until = 0.0
+        with override_settings(CACHES=LOCAL_CACHES):
+            self.assert_logged_in()
+            self.assertFalse(Session.objects.filter(session_key=session_key).exists())
+            self.assert_logged_in()
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class TokenRotationTests(TestCase):
+    """Ротация refresh перечитывает роли и отзывает старый токен; отозванные токены не принимаются"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('client', 'password')
+
+    def setUp(self):
+        cache.clear()
+        self.refresh = token_for_user(self.user)
+
+    def get_orders(self, access):
+        return APIClient().get('/api/orders/user_orders/', headers={'Authorization': f'Bearer {access}'})
+
+    def rotate(self, refresh):
+        return APIClient().post('/api/token/refresh/', {'refresh': str(refresh)}, format='json')
+
+    def test_rotation(self):
+        self.user.is_cook = True
+        self.user.save()
+        response = self.rotate(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(AccessToken(response.data['access'])['is_cook'])
+        self.assertEqual(self.get_orders(response.data['access']).status_code, 200)
+
+        #старый refresh уже обменян, повторная ротация не проходит
+        self.assertEqual(self.rotate(self.refresh).status_code, 401)
+        self.assertEqual(self.rotate(response.data['refresh']).status_code, 200)
+
+    def test_revoke(self):
+        access = self.refresh.access_token
+        self.assertEqual(self.get_orders(access).status_code, 200)
+        response = APIClient().post(
+            '/api/token/revoke/', {'refresh': str(self.refresh)}, format='json',
+            headers={'Authorization': f'Bearer {access}'},
+        )
+        self.assertEqual(response.status_code, 205)
+        self.assertEqual(self.get_orders(access).status_code, 401)
+        self.assertEqual(self.rotate(self.refresh).status_code, 401)
+
+    def test_revocation_unavailable(self):
+        with override_settings(CACHES={**LOCAL_CACHES, 'tokens': UNREACHABLE_REDIS}):
+            self.assertEqual(self.get_orders(self.refresh.access_token).status_code, 503)
+
+
+#async-представления включаются только под ASGI (ASYNC_API_VIEWS), в тестах - этим urlconf
+urlpatterns = urls.async_urlpatterns + urls.sync_urlpatterns
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class AsyncViewsTests(TestCase):
+    """Async-представления отвечают тем же JSON и ETag, что и sync-представления DRF"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = CustomUser.objects.create_user('client', 'password')
+        cls.cook = CustomUser.objects.create_user('cook', 'password', is_cook=True)
+        cls.pizza = Pizza.objects.create(name='Маргарита', price=100, description='', cook=cls.cook)
+        for status in (Order_pizza.OrderStatus.FORMED, Order_pizza.OrderStatus.DRAFT):
+            order = Order_pizza.objects.create(client=cls.client_user, status=status)
+            ProductInOrder.objects.create(order=order, product=cls.pizza, quantity=2)
+            refresh_order_totals([order.id], snapshot_prices=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def headers(self, user):
+        if user is None:
+            return {}
+        return {'Authorization': f'Bearer {token_for_user(user).access_token}'}
+
+    def assert_same(self, path, user):
+        sync_response = self.client.get(path, headers=self.headers(user))
+        #async-представление собирает ответ само, а не берёт закешированный sync-представлением
+        cache.clear()
+        with self.settings(ROOT_URLCONF=__name__):
+            async_response = async_to_sync(self.async_client.get)(path, headers=self.headers(user))
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content))
+        self.assertEqual(async_response.get('ETag'), sync_response.get('ETag'))
+        return async_response
+
+    def test_pizza_list(self):
+        response = self.assert_same('/api/pizzas/', self.client_user)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response['ETag'])
+        self.assertIsNotNone(json.loads(response.content)['draft_order_id'])
+
+    def test_pizza_detail(self):
+        path = f'/api/pizzas/{self.pizza.id}/'
+        self.assertEqual(self.assert_same(path, None).status_code, 200)
+
+    def test_user_orders(self):
+        response = self.assert_same('/api/orders/user_orders/', self.client_user)
+        self.assertEqual(len(json.loads(response.content)), 2)
+        response = self.assert_same('/api/orders/user_orders/', None)
+        self.assertEqual(response.status_code, 401)
+
+    def test_cook_tasks(self):
+        response = self.assert_same('/api/cook/tasks/', self.cook)
+        self.assertEqual(len(json.loads(response.content)), 1)
+        response = self.assert_same('/api/cook/tasks/', self.client_user)
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,102 @@
+"""
+JWT для REST API: роли пользователя лежат в claims, поэтому ни аутентификация, ни permissions
+не ходят в бд. Отозванные токены хранятся в redis (алиас кеша JWT_REVOCATION_CACHE_ALIAS) до истечения их срока.
+Если redis недоступен, токены не принимаются (503), а не считаются неотозванными.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import APIException
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from pizza_lab.sessions import REDIS_ERRORS
+from pizza_lab.user_cache import build_user
+
+REVOKED_KEY_PREFIX = 'jwt:revoked'
+ROLE_CLAIMS = ('is_staff', 'is_superuser', 'is_cook')
+
+
+def token_for_user(user):
+    """Пара refresh/access с ролями; access наследует claims от refresh"""
+    refresh = RefreshToken.for_user(user)
+    refresh['username'] = user.username
+    for claim in ROLE_CLAIMS:
+        refresh[claim] = bool(getattr(user, claim, False))
+    return refresh
+
+
+class RevocationUnavailable(APIException):
+    status_code = 503
+    default_detail = _('Token revocation list is unavailable, try again later.')
+    default_code = 'revocation_unavailable'
+
+
+def revoked_key(jti):
+    return f'{REVOKED_KEY_PREFIX}:{jti}'
+
+
+def revocation_cache():
+    return caches[settings.JWT_REVOCATION_CACHE_ALIAS]
+
+
+def revoke_token(token):
+    """
+    Отзывает токен; False, если он уже был отозван.
+    add атомарен, поэтому из двух одновременных ротаций одного refresh проходит только одна.
+    """
+    #храним jti, пока токен и так не истечёт
+    ttl = int(token['exp'] - timezone.now().timestamp())
+    if ttl <= 0:
+        return True
+    try:
+        return revocation_cache().add(revoked_key(token[api_settings.JTI_CLAIM]), 1, timeout=ttl)
+    except REDIS_ERRORS:
+        raise RevocationUnavailable()
+
+
+def is_revoked(token):
+    try:
+        return revocation_cache().get(revoked_key(token[api_settings.JTI_CLAIM])) is not None
+    except REDIS_ERRORS:
+        raise RevocationUnavailable()
+
+
+def user_from_token(token):
+    return build_user([
+        token[api_settings.USER_ID_CLAIM],
+        token.get('username', ''),
+        True,
+        *(bool(token.get(claim, False)) for claim in ROLE_CLAIMS),
+    ])
+
+
+class RoleJWTAuthentication(JWTAuthentication):
+    """Authorization: Bearer <access>; пользователь собирается из claims токена"""
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if is_revoked(token):
+            raise InvalidToken(_('Token is revoked'))
+        return token
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        return user_from_token(validated_token)
+
+
+async def aauthenticate_request(request):
+    """
+    Пользователь async-представления: по Bearer-токену, иначе по сессии.
+    Неверный токен - AuthenticationFailed, как у DRF.
+    """
+    if request.META.get(api_settings.AUTH_HEADER_NAME):
+        result = await sync_to_async(RoleJWTAuthentication().authenticate)(request)
+        if result is not None:
+            return result[0]
+    return await request.auser()
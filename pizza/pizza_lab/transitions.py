@@ -0,0 +1,75 @@
+from django.db import transaction
+from django.utils import timezone
+
+from pizza_lab import cook_events
+from pizza_lab.metrics import record_order_transitions
+from pizza_lab.models import Order_pizza
+from pizza_lab.progress import refresh_order_totals
+from pizza_lab.reports import record_order_sales
+
+Status = Order_pizza.OrderStatus
+
+#из какого статуса разрешён переход в целевой
+EXPECTED_STATUS = {
+    Status.FORMED: Status.DRAFT,
+    Status.COMPLETED: Status.FORMED,
+    Status.REJECTED: Status.FORMED,
+}
+
+
+def transition_fields(target, manager=None):
+    now = timezone.now()
+    if target == Status.FORMED:
+        return {'formation_datetime': now}
+    return {'completion_datetime': now, 'manager': manager}
+
+
+def transition_order(order, target, manager=None):
+    """
+    Переводит заказ в статус target одним UPDATE ... WHERE status = <ожидаемый>.
+    Возвращает False, если заказ уже не в ожидаемом статусе (например, его завершил другой менеджер).
+    """
+    fields = transition_fields(target, manager)
+    with transaction.atomic():
+        updated = Order_pizza.objects.filter(
+            id=order.id,
+            status=EXPECTED_STATUS[target],
+        ).update(status=target, **fields)
+        if not updated:
+            return False
+        record_transition([order.id], target, fields)
+
+    order.status = target
+    for name, value in fields.items():
+        setattr(order, name, value)
+    return True
+
+
+def bulk_transition(queryset, target, manager=None):
+    """Переводит все подходящие заказы из queryset в статус target, возвращает id переведённых"""
+    fields = transition_fields(target, manager)
+    with transaction.atomic():
+        ids = list(
+            queryset.filter(status=EXPECTED_STATUS[target])
+            .select_for_update()
+            .values_list('id', flat=True)
+        )
+        if ids:
+            Order_pizza.objects.filter(
+                id__in=ids,
+                status=EXPECTED_STATUS[target],
+            ).update(status=target, **fields)
+            record_transition(ids, target, fields)
+    return ids
+
+
+def record_transition(order_ids, target, fields):
+    #всё, что должно обновиться вместе со сменой статуса, в той же транзакции
+    record_order_transitions(target, len(order_ids))
+    if 'completion_datetime' in fields:
+        record_order_sales(order_ids, target, timezone.localdate(fields['completion_datetime']))
+        cook_events.on_orders_closed(order_ids)
+    else:
+        #фиксируем сумму заказа по ценам на момент формирования
+        refresh_order_totals(order_ids, snapshot_prices=True)
+        cook_events.on_orders_formed(order_ids)
@@ -0,0 +1,61 @@
+"""
+Пользователь для AuthenticationMiddleware из кеша: роли, которые проверяют permissions,
+и хеш для проверки сессии. Запись сбрасывается при сохранении или удалении пользователя.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from pizza_lab.models import CustomUser
+
+USER_KEY_PREFIX = 'user:roles'
+#остальные поля (password, last_login) отложены и подгрузятся из бд при обращении
+CACHED_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser', 'is_cook')
+
+
+def user_cache_key(user_id):
+    return f'{USER_KEY_PREFIX}:{user_id}'
+
+
+def get_cached_user(user_id):
+    key = user_cache_key(user_id)
+    entry = cache.get(key)
+    if entry is None:
+        user = CustomUser._default_manager.filter(pk=user_id).first()
+        if user is None:
+            return None
+        entry = {
+            'values': [getattr(user, name) for name in CACHED_FIELDS],
+            'session_auth_hash': user.get_session_auth_hash(),
+        }
+        cache.set(key, entry, timeout=settings.USER_CACHE_TIMEOUT)
+
+    user = build_user(entry['values'])
+    user.cached_session_auth_hash = entry['session_auth_hash']
+    return user
+
+
+def build_user(values):
+    """Пользователь только с полями CACHED_FIELDS (values в том же порядке), без запроса в бд"""
+    return CustomUser.from_db(DEFAULT_DB_ALIAS, list(CACHED_FIELDS), values)
+
+
+def forget_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedUserBackend(ModelBackend):
+    """ModelBackend, который берёт пользователя сессии из кеша, а не из бд"""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user = super().authenticate(request, username, password, **kwargs)
+        if user is None and password is not None:
+            #ModelBackend следом в AUTHENTICATION_BACKENDS проверил бы тот же пароль второй раз
+            raise PermissionDenied
+        return user
+
+    def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
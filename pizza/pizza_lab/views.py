@@ -1,83 +1,155 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db import connection
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F
 from rest_framework import viewsets, status, filters
 from rest_framework.response import Response
 from rest_framework.decorators import action, api_view
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser as IsAdmin, BasePermission
 from django.utils import timezone
-from django.contrib.auth import authenticate, login, logout
-from pizza_lab.models import Pizza, ProductInOrder, Order_pizza, CustomUser
-from serializers import PizzaSerializer, OrderPizzaSerializer, ProductInOrderSerializer,LoginSerializer,RegisterSerializer
+import json
+from asgiref.sync import sync_to_async
+from django.contrib.auth import alogin, authenticate, login, logout
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.exceptions import AuthenticationFailed, PermissionDenied
+from pizza_lab.models import Pizza, ProductInOrder, Order_pizza, CustomUser, Job
+from serializers import PizzaSerializer, OrderPizzaSerializer, ProductInOrderSerializer,LoginSerializer,RegisterSerializer, CartSerializer, CartOperationSerializer, OrderBulkTransitionSerializer, SalesReportQuerySerializer, CookedBatchSerializer, JobSerializer, TokenRevokeSerializer, RoleTokenObtainPairSerializer
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from drf_yasg.utils import swagger_auto_schema
 from pizza_lab.models import CustomUser
-from django.http import HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.decorators import permission_classes, authentication_classes
 from rest_framework.authentication import SessionAuthentication, BasicAuthentication
+from pizza_lab.tokens import RevocationUnavailable, RoleJWTAuthentication, aauthenticate_request, revoke_token
 from django.conf import settings
-import redis
 from .permissions import IsAdmin, IsManager, IsCook, IsClient, IsCookOrManager
+from pizza_lab import menu_cache, cook_events, kitchen, progress
+from pizza_lab.search import PizzaSearchFilter, search_pizzas
+from pizza_lab.pagination import PizzaPagination, OrderPagination
+from pizza_lab.cart import apply_cart_operations
+from pizza_lab.transitions import transition_order, bulk_transition
+from pizza_lab.export import EXPORT_CONTENT_TYPES, aiter_export, iter_export
+from pizza_lab.reports import sales_report
+from pizza_lab.db_router import ReplicaReadMixin, replica_reads
+from pizza_lab.menu_snapshot import MenuSnapshot
+from pizza_lab.images import stage_image
+from pizza_lab.jobs import enqueue
+from pizza_lab.db_pool import pool_stats
+from pizza_lab.perf import span
+from pizza_lab.hashers import HashingOverloaded, LoginThrottled, client_ip, login_slot, run_hashing
 from rest_framework import permissions
 from django.middleware.csrf import get_token
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.views.decorators.csrf import csrf_protect
 from rest_framework.views import APIView
 
-session_storage = redis.StrictRedis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+#JWT (Bearer) проверяется без запроса в бд; сессия остаётся для браузера
+API_AUTHENTICATION_CLASSES = [RoleJWTAuthentication, SessionAuthentication]
+
+def request_data(request): #тело запроса для async-представлений, где нет парсеров DRF
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST
+
+
+async def request_user(request): #пользователь по JWT или по сессии, как у API_AUTHENTICATION_CLASSES
+    try:
+        user = await aauthenticate_request(request)
+    except AuthenticationFailed:
+        return AnonymousUser()
+    if user.is_authenticated and not request.headers.get('Authorization'):
+        #как SessionAuthentication: сессионному пользователю нужен csrf-токен
+        try:
+            SessionAuthentication().enforce_csrf(request)
+        except PermissionDenied:
+            return AnonymousUser()
+    return user
+
+
+def throttled_response(error):
+    if isinstance(error, HashingOverloaded):
+        response = JsonResponse({'error': 'Сервер перегружен, повторите вход позже.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    else:
+        response = JsonResponse({'error': 'Слишком много одновременных попыток входа.'}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    response['Retry-After'] = '1'
+    return response
+
+
+def save_registration(data): #проверка и создание пользователя; выполняется в пуле хеширования
+    serializer = RegisterSerializer(data=data)
+    if serializer.is_valid():
+        serializer.save()
+        return None
+    return serializer.errors
+
 
 @csrf_exempt
-@swagger_auto_schema(method='post', request_body=RegisterSerializer)
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def register_user(request):
-    is_authenticated = request.user and request.user.is_authenticated
-    role = request.data.get('role')
+async def register_user(request): #async: хеширование пароля не занимает воркер
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    data = request_data(request)
+    if data is None:
+        return JsonResponse({'error': 'Invalid JSON'}, status=status.HTTP_400_BAD_REQUEST)
+
+    user = await request_user(request)
+    is_authenticated = user.is_authenticated
+    role = data.get('role')
 
     if not is_authenticated and role in ['moderator', 'superuser', 'cook']:
-        return Response(
+        return JsonResponse(
             {'error': 'Только модератор или админ может создавать сотрудников.'},
             status=status.HTTP_403_FORBIDDEN
         )
 
     if is_authenticated and role in ['moderator', 'superuser', 'cook']:
-        if not (request.user.is_superuser or request.user.is_staff):
-            return Response(
+        if not (user.is_superuser or user.is_staff):
+            return JsonResponse(
                 {'error': 'Недостаточно прав для создания пользователя с ролью сотрудника.'},
                 status=status.HTTP_403_FORBIDDEN
             )
 
-    serializer = RegisterSerializer(data=request.data)
-    if serializer.is_valid():
-        serializer.save()
-        return Response({'message': 'User registered'}, status=status.HTTP_201_CREATED)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        async with login_slot(client_ip(request), str(data.get('username', ''))):
+            errors = await run_hashing(save_registration, data)
+    except (LoginThrottled, HashingOverloaded) as error:
+        return throttled_response(error)
+    if errors is None:
+        return JsonResponse({'message': 'User registered'}, status=status.HTTP_201_CREATED)
+    return JsonResponse(errors, status=status.HTTP_400_BAD_REQUEST)
 
-@swagger_auto_schema(method='post', request_body=LoginSerializer)
-@api_view(['POST'])
-@permission_classes([AllowAny])
-@authentication_classes([])
+@csrf_exempt
 @ensure_csrf_cookie
-def login_user(request):
-    username = request.data.get('username')
-    password = request.data.get('password')
-    user = authenticate(request, username=username, password=password)
-    
+async def login_user(request): #async: authenticate (и пересчёт старого хеша) идёт в пуле хеширования
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    data = request_data(request)
+    if data is None:
+        return JsonResponse({'error': 'Invalid JSON'}, status=status.HTTP_400_BAD_REQUEST)
+    username = data.get('username')
+    password = data.get('password')
+
+    try:
+        async with login_slot(client_ip(request), str(username or '')):
+            user = await run_hashing(authenticate, request, username=username, password=password)
+    except (LoginThrottled, HashingOverloaded) as error:
+        return throttled_response(error)
+
     if user:
-        login(request, user)
+        await alogin(request, user)
         csrf_token = get_token(request)
+        draft_order_id = await Order_pizza.objects.filter(
+            client_id=user.id,
+            status=Order_pizza.OrderStatus.DRAFT,
+        ).values_list('id', flat=True).afirst() or 0
 
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT id
-                FROM pizza_lab_order_pizza
-                WHERE client_id = %s AND status = 'DRAFT'
-            """, [user.id])
-            row = cursor.fetchone()
-
-        draft_order_id = row[0] if row else 0
-
-        return Response({
+        return JsonResponse({
             'message': 'Login successful',
             'username': user.username,
             'is_staff': user.is_staff,
@@ -87,7 +159,27 @@ def login_user(request):
             'draft_order_id': draft_order_id,
         }, status=status.HTTP_200_OK)
 
-    return Response({'error': 'Invalid credentials'}, status=status.HTTP_400_BAD_REQUEST)
+    return JsonResponse({'error': 'Invalid credentials'}, status=status.HTTP_400_BAD_REQUEST)
+
+@csrf_exempt
+async def obtain_token(request): #пара JWT; пароль проверяется в пуле хеширования и под теми же лимитами, что login_user
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    data = request_data(request)
+    if data is None:
+        return JsonResponse({'error': 'Invalid JSON'}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = RoleTokenObtainPairSerializer(data=data, context={'request': request})
+    try:
+        async with login_slot(client_ip(request), str(data.get('username') or '')):
+            is_valid = await run_hashing(serializer.is_valid)
+    except (LoginThrottled, HashingOverloaded) as error:
+        return throttled_response(error)
+    except AuthenticationFailed as error:
+        return JsonResponse({'detail': str(error.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+    if not is_valid:
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return JsonResponse(serializer.validated_data, status=status.HTTP_200_OK)
 
 @swagger_auto_schema(method='post')
 @api_view(['POST'])
@@ -100,13 +192,17 @@ def logout_user(request):
 
 @authentication_classes([SessionAuthentication, BasicAuthentication])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def TypesPizzas(request):
-    query = request.GET.get('text', '').strip().lower()
-
-    pizzas = Pizza.objects.filter(deleted=False)
+    query = request.GET.get('text', '').strip()
 
+    #карточки всегда из снимка в памяти процесса; поиск даёт только id в порядке релевантности
+    snapshot = MenuSnapshot()
     if query:
-        pizzas = pizzas.filter(name__icontains=query)
+        ids = search_pizzas(Pizza.objects.filter(deleted=False), query).values_list('id', flat=True)
+        pizzas = [pizza for pizza in map(snapshot.get, ids) if pizza is not None]
+    else:
+        pizzas = snapshot.items()
 
     products_in_draft_order = ProductInOrder.objects.filter(
         order__client=request.user,
@@ -118,8 +214,11 @@ def TypesPizzas(request):
         'items_in_cart': products_in_draft_order,
     })
 
+@replica_reads
 def Detail(request, id):
-    pizza = get_object_or_404(Pizza, id=id, deleted=False)
+    pizza = MenuSnapshot().get(id)
+    if pizza is None:
+        raise Http404('No Pizza matches the given query.')
 
     return render(request, "detail.html", {
         "pizza": pizza
@@ -133,69 +232,103 @@ def remove_pizza(request, id):
 
     with connection.cursor() as cursor:
         cursor.execute(query, [id])
+    menu_cache.bump_menu_version()
 
     return redirect('pizzas')
 
 def sendText(request):
     input_text = request.POST['text']
 
-class PizzaViewSet(viewsets.ModelViewSet):
+class PizzaViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Pizza.objects.all()
     serializer_class = PizzaSerializer
-    search_fields = ['name']
+    replica_actions = {'list', 'retrieve'}
+    search_fields = ['name', 'description']
     ordering_fields = ['price']
     parser_classes = [MultiPartParser, FormParser, JSONParser]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    authentication_classes = [SessionAuthentication, BasicAuthentication]
+    filter_backends = [PizzaSearchFilter, filters.OrderingFilter]
+    pagination_class = PizzaPagination
+    authentication_classes = API_AUTHENTICATION_CLASSES
     model_class = CustomUser
 
     def get_queryset(self):
-        return Pizza.objects.filter(deleted=False)
+        return Pizza.objects.filter(deleted=False).select_related('cook')
     
     def list(self, request, *args, **kwargs): #вывод всех пицц
-        queryset = self.filter_queryset(self.get_queryset())
-
-        user = request.user
-        if user.is_authenticated and getattr(user, 'is_cook', False):
-            queryset = queryset.filter(cook=user)
-        is_vegetarian = request.query_params.get('is_vegetarian', None)
-        if is_vegetarian is not None:
-            queryset = queryset.filter(is_vegetarian=is_vegetarian.lower() == 'true')
+        draft_order_id = self.get_draft_order_id(request)
+        cache_key = None
+        entry = None
+
+        if self.paginator is None or not self.paginator.get_page_size(request):
+            #общее тело меню берём из кеша, id черновика подмешиваем отдельно
+            cache_key = menu_cache.menu_cache_key(request)
+            entry = menu_cache.get_menu(cache_key)
+            if entry is not None:
+                etag = menu_cache.make_etag(entry['etag'], draft_order_id)
+                if etag in parse_etags(request.headers.get('If-None-Match', '')):
+                    return self.with_cache_headers(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+        if entry is None:
+            queryset = self.filter_queryset(self.get_queryset())
+
+            user = request.user
+            if user.is_authenticated and getattr(user, 'is_cook', False):
+                queryset = queryset.filter(cook=user)
+            is_vegetarian = request.query_params.get('is_vegetarian', None)
+            if is_vegetarian is not None:
+                queryset = queryset.filter(is_vegetarian=is_vegetarian.lower() == 'true')
+
+            ordering = request.query_params.get('ordering', None)
+            if ordering:
+                queryset = queryset.order_by(ordering)
+
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response({
+                    "pizzas": serializer.data,
+                    "draft_order_id": draft_order_id,
+                })
+
+            #запрос выполняется до span, иначе его время попало бы и в db, и в serialize
+            pizzas = list(queryset)
+            serializer = self.get_serializer(pizzas, many=True)
+            with span('serialize'):
+                data = list(serializer.data)
+            entry = menu_cache.set_menu(cache_key, data)
+
+        response = Response({
+            "pizzas": entry['pizzas'],
+            "draft_order_id": draft_order_id,
+        })
+        return self.with_cache_headers(response, menu_cache.make_etag(entry['etag'], draft_order_id))
 
-        ordering = request.query_params.get('ordering', None)
-        if ordering:
-            queryset = queryset.order_by(ordering)
+    def with_cache_headers(self, response, etag):
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ['Cookie', 'Authorization'])
+        return response
 
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response({
-                "pizzas": serializer.data,
-                "draft_order_id": self.get_draft_order_id(request),
-            })
-
-        serializer = self.get_serializer(queryset, many=True)
-        return Response({
-            "pizzas": serializer.data,
-            "draft_order_id": self.get_draft_order_id(request),
-        })
+    def retrieve(self, request, *args, **kwargs): #одна пицца из снимка меню, без запроса в бд
+        pizza = MenuSnapshot().get(kwargs['pk'])
+        if pizza is None:
+            raise Http404('No Pizza matches the given query.')
+        return Response(dict(pizza.data))
 
     def get_draft_order_id(self, request): #нужен для вывода id заявки-черновика текущего пользователя.
-        user = request.user
-        if not user.is_authenticated:
-            return None
-        draft_order = Order_pizza.objects.filter(
-            client=user,
-            status=Order_pizza.OrderStatus.DRAFT
-        ).first()
-        return draft_order.id if draft_order else None
+        return menu_cache.get_draft_order_id(request.user)
     
     @swagger_auto_schema(request_body=PizzaSerializer)
     def create(self, request, *args, **kwargs): #создание пиццы
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            #картинку в хранилище загружает фоновая задача, запрос её не ждёт
+            image = self.pop_upload(serializer)
+            pizza = serializer.save()
+            menu_cache.bump_menu_version()
+            data = self.get_serializer(pizza).data
+            data['image_job'] = self.enqueue_image(request, pizza, image)
+            return Response(data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
     @swagger_auto_schema(request_body=PizzaSerializer)
@@ -203,19 +336,52 @@ class PizzaViewSet(viewsets.ModelViewSet):
         pizza = get_object_or_404(Pizza, pk=pk)
         serializer = self.get_serializer(pizza, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
+            image = self.pop_upload(serializer)
+            pizza = serializer.save()
+            cleanup_job = None
+            if 'image' in serializer.validated_data and pizza.image_variants:
+                cleanup_job = self.enqueue_variant_cleanup(request, pizza)
+            menu_cache.bump_menu_version()
+            data = self.get_serializer(pizza).data
+            data['image_job'] = self.enqueue_image(request, pizza, image) or cleanup_job
+            return Response(data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
+    def pop_upload(self, serializer): #новый файл уходит в задачу, а явные null и пустое значение сохраняются как есть
+        image = serializer.validated_data.get('image')
+        if image:
+            del serializer.validated_data['image']
+        return image
+
+    def enqueue_image(self, request, pizza, image): #id задачи загрузки картинки, статус - /api/jobs/<id>/
+        if not image:
+            return None
+        job = enqueue('pizza.store_image', user=request.user, pizza_id=pizza.id, staged_name=stage_image(image))
+        return job.id
+
+    def enqueue_variant_cleanup(self, request, pizza): #картинку очистили - уменьшенные копии удаляет задача, не запрос
+        variants = pizza.image_variants
+        Pizza.objects.filter(id=pizza.id).update(image_variants={})
+        pizza.image_variants = {}
+        job = enqueue('pizza.delete_variants', user=request.user, variants=variants)
+        return job.id
+
     def delete(self, request, pk, format=None):
         pizza = get_object_or_404(Pizza, pk=pk)
         pizza.delete()
+        menu_cache.bump_menu_version()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-class OrderPizzaViewSet(viewsets.ModelViewSet):
+    def perform_destroy(self, instance):
+        instance.delete()
+        menu_cache.bump_menu_version()
+
+class OrderPizzaViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Order_pizza.objects.exclude(status=Order_pizza.OrderStatus.DELETED)
     serializer_class = OrderPizzaSerializer
-    authentication_classes = [SessionAuthentication, BasicAuthentication]
+    replica_actions = {'user_orders'}
+    pagination_class = OrderPagination
+    authentication_classes = API_AUTHENTICATION_CLASSES
     permission_classes = [IsCookOrManager]
 
     def get_permissions(self):
@@ -226,18 +392,24 @@ class OrderPizzaViewSet(viewsets.ModelViewSet):
                 return [IsCookOrManager()]
             else:
                 return [IsClient()]
-        elif self.action in ['create', 'add_to_draft']:
+        elif self.action in ['create', 'add_to_draft', 'cart']:
             return [IsClient()]
-        elif self.action in ['update_order', 'reject', 'complete']:
+        elif self.action in ['update_order', 'reject', 'complete', 'bulk_transition']:
             return [IsManager()]
         elif self.action == 'form':
             return [IsAuthenticated()]
         return [permissions.IsAuthenticated()]
 
     def get_queryset(self):
-        user = self.request.user
+        return OrderPizzaSerializer.setup_eager_loading(self.get_scoped_queryset())
+
+    def get_scoped_queryset(self): #заказы, доступные текущему пользователю, с фильтрами из query params
+        #схема строится и без запроса (manage.py build_api_schema)
+        if getattr(self, 'swagger_fake_view', False):
+            return Order_pizza.objects.none()
 
-        if getattr(self, 'swagger_fake_view', False) or not user.is_authenticated:
+        user = self.request.user
+        if not user.is_authenticated:
             return Order_pizza.objects.none()
 
         queryset = super().get_queryset()
@@ -255,6 +427,7 @@ class OrderPizzaViewSet(viewsets.ModelViewSet):
         end_date = self.request.query_params.get('end_date')
         client_username = self.request.query_params.get('client_username')
         manager_username = self.request.query_params.get('manager_username')
+        is_ready = self.request.query_params.get('is_ready')
 
         if status:
             queryset = queryset.filter(status=status)
@@ -264,18 +437,41 @@ class OrderPizzaViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(client__username=client_username)
         if manager_username:
             queryset = queryset.filter(manager__username=manager_username)
+        if is_ready is not None:
+            queryset = queryset.filter(is_ready=is_ready.lower() == 'true')
 
         return queryset
 
+    @action(detail=False, methods=['get']) #потоковая выгрузка заказов в csv или ndjson
+    def export(self, request):
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in EXPORT_CONTENT_TYPES:
+            return Response({"error": "export_format must be csv or ndjson."}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.get_scoped_queryset()
+        #под ASGI нужен async-итератор, иначе django соберёт всю выгрузку в память
+        if isinstance(request._request, ASGIRequest):
+            content = aiter_export(queryset, export_format)
+        else:
+            content = iter_export(queryset, export_format)
+        response = StreamingHttpResponse(content, content_type=EXPORT_CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = f'attachment; filename="orders.{export_format}"'
+        return response
+
     def perform_create(self, serializer):
         #фиксируем пользователя
         serializer.save(client=self.request.user, status=Order_pizza.OrderStatus.DRAFT)
+        menu_cache.forget_draft_order(self.request.user.id)
 
     @swagger_auto_schema(request_body=OrderPizzaSerializer)
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
-            self.perform_create(serializer)
+            try:
+                with transaction.atomic():
+                    self.perform_create(serializer)
+            except IntegrityError:
+                return Response({"error": "Draft order already exists."}, status=status.HTTP_400_BAD_REQUEST)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -292,38 +488,49 @@ class OrderPizzaViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['put']) #меняет статус на сформирован
     def form(self, request, pk=None):
         order = self.get_object()
-        if order.status != Order_pizza.OrderStatus.DRAFT:
+        if not transition_order(order, Order_pizza.OrderStatus.FORMED):
             return Response({"error": "Only draft orders can be formed."}, status=status.HTTP_400_BAD_REQUEST)
 
-        order.status = Order_pizza.OrderStatus.FORMED
-        order.formation_datetime = timezone.now()
-        order.save()
+        menu_cache.forget_draft_order(order.client_id)
         return Response(OrderPizzaSerializer(order).data)
 
     @action(detail=True, methods=['put']) #меняет статус на завершён
     def complete(self, request, pk=None):
         order = self.get_object()
-        if order.status != Order_pizza.OrderStatus.FORMED:
+        if not transition_order(order, Order_pizza.OrderStatus.COMPLETED, manager=request.user):
             return Response({"error": "Only formed orders can be completed."}, status=status.HTTP_400_BAD_REQUEST)
 
-        order.status = Order_pizza.OrderStatus.COMPLETED
-        order.completion_datetime = timezone.now()
-        order.manager = request.user
-        order.save()
         return Response(OrderPizzaSerializer(order).data)
 
     @action(detail=True, methods=['put']) #меняет статус на отклонён
     def reject(self, request, pk=None):
         order = self.get_object()
-        if order.status != Order_pizza.OrderStatus.FORMED:
+        if not transition_order(order, Order_pizza.OrderStatus.REJECTED, manager=request.user):
             return Response({"error": "Only formed orders can be rejected."}, status=status.HTTP_400_BAD_REQUEST)
 
-        order.status = Order_pizza.OrderStatus.REJECTED
-        order.completion_datetime = timezone.now()
-        order.manager = request.user
-        order.save()
         return Response(OrderPizzaSerializer(order).data)
 
+    @action(detail=False, methods=['post']) #завершает или отклоняет сформированные заказы пачкой
+    @swagger_auto_schema(request_body=OrderBulkTransitionSerializer)
+    def bulk_transition(self, request):
+        serializer = OrderBulkTransitionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        queryset = Order_pizza.objects.all()
+        if 'ids' in data:
+            queryset = queryset.filter(id__in=data['ids'])
+        else:
+            queryset = queryset.filter(formation_datetime__range=[data['start_date'], data['end_date']])
+
+        updated_ids = bulk_transition(queryset, data['status'], manager=request.user)
+
+        result = {"updated": sorted(updated_ids)}
+        if 'ids' in data:
+            result["conflicts"] = sorted(set(data['ids']) - set(updated_ids))
+        return Response(result, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=['post'])  # добавление пиццы в заявку черновик
     @swagger_auto_schema(request_body=OrderPizzaSerializer)
     def add_to_draft(self, request):
@@ -331,37 +538,47 @@ class OrderPizzaViewSet(viewsets.ModelViewSet):
         if not user.is_authenticated:
             return Response({"error": "User must be authenticated."}, status=401)
 
-        draft_order = Order_pizza.objects.filter(client=user, status=Order_pizza.OrderStatus.DRAFT).first()
-
-        if not draft_order:
-            draft_order = Order_pizza.objects.create(client=user, status=Order_pizza.OrderStatus.DRAFT)
-
         product_id = request.data.get('product_id')
         quantity = request.data.get('quantity')
 
         if not product_id or not quantity:
             return Response({"error": "Product ID and quantity are required."}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = CartOperationSerializer(data={'product_id': product_id, 'delta': quantity})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        product = get_object_or_404(Pizza, id=product_id)
-        product_in_order, created = ProductInOrder.objects.get_or_create(
-            order=draft_order,
-            product=product,
-            defaults={'quantity': quantity}
-        )
-
-        if not created:
-            product_in_order.quantity += int(quantity)
-            product_in_order.save()
+        product = MenuSnapshot().get(serializer.validated_data['product_id'])
+        if product is None:
+            raise Http404('No Pizza matches the given query.')
+        draft_order = apply_cart_operations(user, [{'product_id': product.id, 'delta': serializer.validated_data['delta']}])
 
         return Response({
             "message": "Product added to draft order.",
-            "order_id": draft_order.id
+            "order_id": draft_order.id if draft_order else None
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])  # пакетное изменение корзины: [{product_id, delta}]
+    @swagger_auto_schema(request_body=CartSerializer)
+    def cart(self, request):
+        serializer = CartSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        draft_order = apply_cart_operations(request.user, serializer.validated_data['items'])
+        if draft_order is None:
+            return Response({"order_id": None, "products": []}, status=status.HTTP_200_OK)
+
+        products = ProductInOrder.objects.filter(order=draft_order).select_related('product__cook').order_by('id')
+        return Response({
+            "order_id": draft_order.id,
+            "products": ProductInOrderSerializer(products, many=True, context={'request': request}).data,
         }, status=status.HTTP_200_OK)
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         instance.status = Order_pizza.OrderStatus.DELETED
         instance.save()
+        menu_cache.forget_draft_order(instance.client_id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     def retrieve(self, request, *args, **kwargs): #возвращает заявку по id 
@@ -381,9 +598,17 @@ class OrderPizzaViewSet(viewsets.ModelViewSet):
             )
         else:
             orders = Order_pizza.objects.filter(client=user).exclude(status=Order_pizza.OrderStatus.DELETED)
+        orders = OrderPizzaSerializer.setup_eager_loading(orders)
+
+        page = self.paginate_queryset(orders)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
 
-        serializer = self.get_serializer(orders, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        serializer = self.get_serializer(list(orders), many=True)
+        with span('serialize'):
+            data = serializer.data
+        return Response(data, status=status.HTTP_200_OK)
     
     @action(detail=True, methods=['delete'])
     def remove_pizza(self, request, pk=None):
@@ -393,38 +618,53 @@ class OrderPizzaViewSet(viewsets.ModelViewSet):
         if not product_id:
             return Response({"error": "Product ID is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        product_in_order = get_object_or_404(ProductInOrder, order=order, product_id=product_id)
-
-        if product_in_order.quantity > 1:
-            product_in_order.quantity -= 1
-            product_in_order.save()
-        else:
-            product_in_order.delete()
+        products = ProductInOrder.objects.filter(order=order, product_id=product_id)
+        with transaction.atomic():
+            #уменьшение на стороне бд: параллельные удаления не теряют друг друга
+            decremented = products.filter(quantity__gt=1).update(
+                quantity=F('quantity') - 1,
+                is_ready=progress.line_ready_expression(F('quantity') - 1),
+            )
+            if not decremented:
+                if not products.delete()[0]:
+                    raise Http404('No ProductInOrder matches the given query.')
 
-            if not ProductInOrder.objects.filter(order=order).exists():
-                order.delete()
-                return Response({"message": "Order deleted as it was empty."}, status=status.HTTP_200_OK)
+                if not ProductInOrder.objects.filter(order=order).exists():
+                    order.delete()
+                    transaction.on_commit(lambda: menu_cache.forget_draft_order(order.client_id))
+                    return Response({"message": "Order deleted as it was empty."}, status=status.HTTP_200_OK)
 
+            progress.refresh_order_totals([order.id])
         return Response({"message": "Product removed from order."}, status=status.HTTP_200_OK)
     
 class ProductInOrderViewSet(viewsets.ModelViewSet):
     queryset = ProductInOrder.objects.all()
     serializer_class = ProductInOrderSerializer
-    authentication_classes = [SessionAuthentication, BasicAuthentication]
+    authentication_classes = API_AUTHENTICATION_CLASSES
     permission_classes = [IsAuthenticated]
 
+    def perform_create(self, serializer):
+        #позиция и счётчики заказа меняются вместе
+        with transaction.atomic():
+            product_in_order = serializer.save()
+            progress.refresh_order_totals([product_in_order.order_id])
+
     @swagger_auto_schema(request_body=ProductInOrderSerializer)
     def update(self, request, pk=None):
         product_in_order = self.get_object()
         serializer = self.get_serializer(product_in_order, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                progress.refresh_order_totals([product_in_order.order_id])
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
-        instance.delete()
+        with transaction.atomic():
+            instance.delete()
+            progress.refresh_order_totals([instance.order_id])
         return Response(status=status.HTTP_204_NO_CONTENT)
     
     @action(detail=False, methods=['post'], url_path='increment-cooked')
@@ -435,19 +675,34 @@ class ProductInOrderViewSet(viewsets.ModelViewSet):
         if not order_id or not product_id:
             return Response({'error': 'order_id and product_id are required.'}, status=400)
 
-        try:
-            product_in_order = ProductInOrder.objects.get(order_id=order_id, product_id=product_id)
-        except ProductInOrder.DoesNotExist:
+        result, remaining = kitchen.increment_cooked(order_id, product_id)
+        if result == kitchen.NOT_FOUND:
             return Response({'error': 'ProductInOrder not found.'}, status=404)
-
-        if product_in_order.end_quantity < product_in_order.quantity:
-            product_in_order.end_quantity += 1
-            product_in_order.save()
-            return Response({'message': 'Cooked count incremented.'}, status=200)
-        else:
+        if result == kitchen.ALREADY_COOKED:
             return Response({'message': 'All pizzas already cooked.'}, status=400)
-
-class CookTaskListView(APIView):
+        return Response({'message': 'Cooked count incremented.', 'remaining_to_cook': remaining}, status=200)
+
+    @action(detail=False, methods=['post'], url_path='increment-cooked-batch') #повар отмечает целый противень
+    @swagger_auto_schema(request_body=CookedBatchSerializer)
+    def increment_cooked_batch(self, request):
+        serializer = CookedBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        results = []
+        with transaction.atomic():
+            for item in serializer.validated_data['items']:
+                result, remaining = kitchen.increment_cooked(item['order_id'], item['product_id'], item['count'])
+                results.append({
+                    'order_id': item['order_id'],
+                    'product_id': item['product_id'],
+                    'result': result,
+                    'remaining_to_cook': remaining,
+                })
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+class CookTaskListView(ReplicaReadMixin, APIView):
+    authentication_classes = API_AUTHENTICATION_CLASSES
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -455,26 +710,83 @@ class CookTaskListView(APIView):
         if not getattr(user, 'is_cook', False):
             return Response({'detail': 'Only cooks can access this.'}, status=403)
 
-        #получаем все позиции, где заказ сформирован и пицца под ответсвенностью повару
-        product_entries = ProductInOrder.objects.filter(
-            order__status='FORMED',
-            product__cook=user
-        ).select_related('product', 'order')
-
-        result = []
-
-        for entry in product_entries:
-            remaining = entry.quantity - entry.end_quantity
-            if remaining <= 0:
-                continue
-
-            result.append({
+        #фильтрация и остаток считаются в бд, готовые позиции не загружаются
+        result = [
+            {
                 'pizza_id': entry.product.id,
                 'pizza_name': entry.product.name,
                 'pizza_image': request.build_absolute_uri(entry.product.image.url) if entry.product.image else None,
                 'order_id': entry.order.id,
                 'formation_datetime': entry.order.formation_datetime,
-                'remaining_to_cook': remaining,
-            })
+                'remaining_to_cook': entry.remaining,
+            }
+            for entry in kitchen.cook_tasks(user)
+        ]
 
-        return Response(result, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(result, status=status.HTTP_200_OK)
+
+class SalesReportView(APIView):
+    authentication_classes = API_AUTHENTICATION_CLASSES
+    permission_classes = [IsManager]
+
+    def get(self, request):
+        serializer = SalesReportQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        #читаем только дневную сводку, таблицы заказов не затрагиваются
+        data = serializer.validated_data
+        rows = sales_report(data.get('start'), data.get('end'), data['group_by'])
+        return Response(rows, status=status.HTTP_200_OK)
+
+
+class TokenRevokeView(APIView): #выход для клиентов с JWT: отзывает refresh и текущий access
+    authentication_classes = [RoleJWTAuthentication]
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(request_body=TokenRevokeSerializer)
+    def post(self, request):
+        serializer = TokenRevokeSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        revoke_token(serializer.validated_data['refresh'])
+        if request.auth is not None:
+            revoke_token(request.auth)
+        return Response(status=status.HTTP_205_RESET_CONTENT)
+
+
+class JobStatusView(APIView): #статус фоновой задачи для опроса клиентом
+    authentication_classes = API_AUTHENTICATION_CLASSES
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        job = get_object_or_404(Job, pk=pk)
+        if job.created_by_id != request.user.id and not (request.user.is_staff or request.user.is_superuser):
+            return Response({"error": "Нет доступа к этой задаче."}, status=status.HTTP_403_FORBIDDEN)
+        return Response(JobSerializer(job).data, status=status.HTTP_200_OK)
+
+
+class DbPoolStatsView(APIView): #соединения с бд этого процесса для мониторинга
+    authentication_classes = API_AUTHENTICATION_CLASSES
+    permission_classes = [IsManager]
+
+    def get(self, request):
+        return Response(pool_stats(), status=status.HTTP_200_OK)
+
+
+async def cook_task_events(request): #поток изменений задач повара (SSE), работает только под ASGI
+    if not isinstance(request, ASGIRequest):
+        #под WSGI django читает async-поток целиком в список: бесконечный поток занял бы воркер навсегда
+        return JsonResponse({'detail': 'Event stream requires the ASGI server.'}, status=status.HTTP_501_NOT_IMPLEMENTED)
+    try:
+        #Bearer-токен или сессия, как у CookTaskListView
+        user = await aauthenticate_request(request)
+    except (AuthenticationFailed, RevocationUnavailable) as error:
+        return JsonResponse({'detail': str(error.detail)}, status=error.status_code)
+    if not user.is_authenticated or not getattr(user, 'is_cook', False):
+        return JsonResponse({'detail': 'Only cooks can access this.'}, status=403)
+
+    response = StreamingHttpResponse(cook_events.stream_events(user.id, request.build_absolute_uri), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,14 +1,33 @@
 from rest_framework import serializers
-from pizza_lab.models import Pizza, Order_pizza, ProductInOrder
+from django.db.models import Prefetch
+from pizza_lab.models import Pizza, Order_pizza, ProductInOrder, Job
 from collections import OrderedDict
 from pizza_lab.models import CustomUser
+from pizza_lab.menu_snapshot import MenuSnapshot
+from pizza_lab.cart import MAX_CART_DELTA
+from pizza_lab.images import thumbnail_url, variant_urls
+from pizza_lab.tokens import revoke_token, token_for_user
+from pizza_lab.user_cache import get_cached_user
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 
 class PizzaSerializer(serializers.ModelSerializer):
     cook = serializers.CharField(source='cook.username', read_only=True)
+    image_thumbnail = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Pizza
-        fields = ['id', 'name', 'price', 'description', 'cook', 'deleted', 'image', 'is_vegetarian']
+        fields = ['id', 'name', 'price', 'description', 'cook', 'deleted', 'image', 'image_thumbnail', 'image_variants', 'is_vegetarian']
+
+    def get_image_thumbnail(self, instance):
+        return thumbnail_url(instance)
+
+    def get_image_variants(self, instance):
+        return variant_urls(instance)
 
     def get_fields(self):
         new_fields = OrderedDict()
@@ -86,6 +105,22 @@ class RegisterSerializer(serializers.ModelSerializer):
         )
         return user
 
+class CartOperationSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField(min_value=1)
+    delta = serializers.IntegerField(min_value=-MAX_CART_DELTA, max_value=MAX_CART_DELTA)
+
+class CartSerializer(serializers.Serializer):
+    items = CartOperationSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        #добавлять можно только существующие неудалённые пиццы
+        added_ids = {item['product_id'] for item in items if item['delta'] > 0}
+        snapshot = MenuSnapshot()
+        missing_ids = sorted(product_id for product_id in added_ids if snapshot.get(product_id) is None)
+        if missing_ids:
+            raise serializers.ValidationError(f'Unknown products: {missing_ids}')
+        return items
+
 class OrderPizzaSerializer(serializers.ModelSerializer):
     client = serializers.PrimaryKeyRelatedField(queryset=CustomUser.objects.all())
     manager = serializers.PrimaryKeyRelatedField(queryset=CustomUser.objects.all(), allow_null=True)
@@ -93,12 +128,100 @@ class OrderPizzaSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Order_pizza
-        fields = ['id', 'status', 'creation_datetime', 'formation_datetime', 'completion_datetime', 'client', 'manager', 'products']
-        read_only_fields = ['creation_datetime', 'formation_datetime', 'completion_datetime', 'client', 'manager', 'products']
+        fields = ['id', 'status', 'creation_datetime', 'formation_datetime', 'completion_datetime', 'client', 'manager', 'products',
+                  'items_total', 'items_cooked', 'total_price', 'is_ready']
+        read_only_fields = ['creation_datetime', 'formation_datetime', 'completion_datetime', 'client', 'manager', 'products',
+                            'items_total', 'items_cooked', 'total_price', 'is_ready']
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        #позиции заказа вместе с пиццами и поварами одним запросом на весь список
+        return queryset.prefetch_related(
+            Prefetch(
+                'productinorder_set',
+                queryset=ProductInOrder.objects.select_related('product__cook').order_by('id'),
+            )
+        )
 
     def get_fields(self):
         new_fields = OrderedDict()
         for name, field in super().get_fields().items():
             field.required = False
             new_fields[name] = field
-        return new_fields
\ No newline at end of file
+        return new_fields
+
+class OrderBulkTransitionSerializer(serializers.Serializer):
+    STATUS_CHOICES = [
+        (Order_pizza.OrderStatus.COMPLETED, 'Завершён'),
+        (Order_pizza.OrderStatus.REJECTED, 'Отклонён'),
+    ]
+
+    status = serializers.ChoiceField(choices=STATUS_CHOICES)
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, required=False)
+    start_date = serializers.DateTimeField(required=False)
+    end_date = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if 'ids' not in data and not ('start_date' in data and 'end_date' in data):
+            raise serializers.ValidationError('Either ids or start_date and end_date are required.')
+        return data
+
+
+class SalesReportQuerySerializer(serializers.Serializer):
+    GROUP_CHOICES = ['day', 'pizza', 'cook', 'day_pizza', 'day_cook']
+
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    group_by = serializers.ChoiceField(choices=GROUP_CHOICES, default='day_pizza')
+
+
+class CookedItemSerializer(serializers.Serializer):
+    order_id = serializers.IntegerField(min_value=1)
+    product_id = serializers.IntegerField(min_value=1)
+    count = serializers.IntegerField(min_value=1, default=1)
+
+class CookedBatchSerializer(serializers.Serializer):
+    items = CookedItemSerializer(many=True, allow_empty=False)
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ['id', 'name', 'status', 'attempts', 'max_attempts', 'run_after', 'result', 'error', 'creation_datetime', 'completion_datetime']
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return token_for_user(user)
+
+
+class RoleTokenRefreshSerializer(serializers.Serializer):
+    """Обмен refresh на новую пару; роли перечитываются, старый refresh отзывается"""
+    refresh = serializers.CharField()
+    access = serializers.CharField(read_only=True)
+
+    def validate(self, attrs):
+        try:
+            refresh = RefreshToken(attrs['refresh'])
+        except TokenError as error:
+            raise InvalidToken(error.args[0])
+        user = get_cached_user(refresh[jwt_settings.USER_ID_CLAIM])
+        if user is None or not user.is_active:
+            raise AuthenticationFailed('No active account found for the given token.', 'no_active_account')
+
+        #отзыв и есть проверка: refresh, отозванный раньше или параллельной ротацией, не обменивается
+        if not revoke_token(refresh):
+            raise InvalidToken('Token is revoked')
+        new_refresh = token_for_user(user)
+        return {'access': str(new_refresh.access_token), 'refresh': str(new_refresh)}
+
+
+class TokenRevokeSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+
+    def validate_refresh(self, value):
+        try:
+            return RefreshToken(value)
+        except TokenError as error:
+            raise serializers.ValidationError(error.args[0])